@@ -15,13 +15,10 @@ class EdlImportApp(Application):
         """
         Called as the application is being initialized
         """
-        
-        # first, we use the special import_module command to access the app module
-        # that resides inside the python folder in the app. This is where the actual UI
-        # and business logic of the app is kept. By using the import_module command,
-        # toolkit's code reload mechanism will work properly.
-        app_payload = self.import_module("app")
-        # app_payload = self.import_module("simple_app")
+
+        # the app module is imported lazily, see _get_app_payload. this keeps edl, qt ui
+        # and resources out of engine startup for artists who never open the importer.
+        self._app_payload = None
 
         # now register a *command*, which is normally a menu entry of some kind on a Shotgun
         # menu (but it depends on the engine). The engine will manage this command and 
@@ -29,7 +26,7 @@ class EdlImportApp(Application):
 
         # first, set up our callback, calling out to a method inside the app module contained
         # in the python folder of the app
-        menu_callback = lambda: app_payload.dialog.show_dialog(self)
+        menu_callback = lambda: self._get_app_payload().show_dialog(self)
 
         params = {
             "title": "EDL Import",
@@ -37,3 +34,22 @@ class EdlImportApp(Application):
 
         # now register the command with the engine
         self.engine.register_command("edl_import", menu_callback, params)
+
+        # headless engines, e.g. tk-shell, also get the blocking watch folder command:
+        # > tank edl_watch_folder [path]
+        if not self.engine.has_ui:
+            watch_callback = lambda *args: self._get_app_payload().run_watch_folder(self, *args)
+            self.engine.register_command("edl_watch_folder", watch_callback, {"title": "EDL Watch Folder"})
+
+    def _get_app_payload(self):
+        """
+        Import the app module on first use and keep it for later invocations.
+        """
+        if self._app_payload is None:
+            # we use the special import_module command to access the app module
+            # that resides inside the python folder in the app. This is where the actual UI
+            # and business logic of the app is kept. By using the import_module command,
+            # toolkit's code reload mechanism will work properly.
+            # the submodules doing the work are imported and timed by the command functions
+            self._app_payload = self.import_module("app")
+        return self._app_payload
@@ -8,4 +8,37 @@
 # agreement to the Shotgun Pipeline Toolkit Source Code License. All rights 
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
-from . import dialog
+import importlib
+import sys
+import time
+
+import sgtk
+
+# standard toolkit logger
+logger = sgtk.platform.get_logger(__name__)
+
+# submodules are imported on first use, the watch folder runs in engines without qt
+
+
+def _import_submodule(module_name, command_name):
+    """Import a submodule, the first import is timed, it is what engine startup no longer spends.
+    :param module_name: str
+    :param command_name: str command triggering the import
+    :return: module
+    """
+    full_name = '{}.{}'.format(__name__, module_name)
+    if full_name in sys.modules:
+        return sys.modules[full_name]
+    start_time = time.time()
+    module = importlib.import_module(full_name)
+    logger.debug('Imported {} in {:.1f} ms on first {} invocation'.format(
+        module_name, (time.time() - start_time) * 1000.0, command_name))
+    return module
+
+
+def show_dialog(app_instance):
+    _import_submodule('dialog', 'edl_import').show_dialog(app_instance)
+
+
+def run_watch_folder(app_instance, *args):
+    _import_submodule('watcher', 'edl_watch_folder').run_watch_folder(app_instance, *args)
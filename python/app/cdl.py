@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+# Mind Machine customized
+
+from array import array
+import os
+import re
+
+import sgtk
+
+# standard toolkit logger
+logger = sgtk.platform.get_logger(__name__)
+
+# float number as written by avid / resolve / baselight in asc comments
+_num = r'([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)'
+_triplet = r'\(\s*' + r'\s+'.join([_num] * 3) + r'\s*\)'
+
+# regex to match asc comments for all events in a single pass
+# each line is prefixed with the event index, see CdlTable.from_comments
+rgx_asc = re.compile(r'^(\d+)\t\*\s*ASC_(?:SOP\s*' + _triplet + r'\s*' + _triplet + r'\s*' + _triplet +
+                     r'|SAT\s*' + _num + r')', re.MULTILINE)
+
+# value used for the nuke cc field when an event carries no grade
+NO_CDL = 'unavailable'
+
+# identity values used when only one of SOP / SAT is present
+_identity_sop = (1.0, 1.0, 1.0, 0.0, 0.0, 0.0, 1.0, 1.0, 1.0)
+_identity_sat = 1.0
+
+_cc_template = '''<ColorCorrection{xmlns} id="{id}">
+    <SOPNode>
+        <Slope>{slope}</Slope>
+        <Offset>{offset}</Offset>
+        <Power>{power}</Power>
+    </SOPNode>
+    <SatNode>
+        <Saturation>{sat}</Saturation>
+    </SatNode>
+</ColorCorrection>'''
+
+_xml_header = '<?xml version="1.0" encoding="UTF-8"?>'
+_cdl_ns = 'urn:ASC:CDL:v1.01'
+
+
+class CdlTable(object):
+    """Numeric ASC CDL values for a whole EDL, de-duplicated by grade.
+
+    Values are kept column-wise in flat arrays, one entry (or triplet) per unique grade.
+    ``event_grades`` maps every event index to its grade id, -1 when the event has no grade.
+    Events with asc comments that cannot be parsed keep their raw comment text as nuke cc.
+    """
+
+    def __init__(self):
+        self.slope = array('d')
+        self.offset = array('d')
+        self.power = array('d')
+        self.saturation = array('d')
+        self.event_grades = array('l')
+        # one nuke cc string per unique grade, shared by all events using it
+        self.nuke_cc = list()
+        # hash index of grade values to grade id
+        self._index = dict()
+        # event index to raw asc comments of events whose values could not be parsed
+        self.raw_nuke_cc = dict()
+
+    def __len__(self):
+        return len(self.saturation)
+
+    @classmethod
+    def from_comments(cls, comment_lists):
+        """Build the table from the comment lists of all edl events.
+        :param comment_lists: list of lists of str, one list per event
+        :return: CdlTable
+        """
+        table = cls()
+
+        # join every asc comment of the edl into one block and match them all at once
+        lines = list()
+        asc_comments = dict()
+        for event_index, comments in enumerate(comment_lists):
+            for comment in comments:
+                comment = str(comment).strip()
+                if comment.startswith('* ASC_'):
+                    lines.append('{}\t{}'.format(event_index, comment))
+                    asc_comments.setdefault(event_index, list()).append(comment)
+
+        sop_values = dict()
+        sat_values = dict()
+        raw_comments = dict()
+        match_counts = dict()
+        for m in rgx_asc.finditer('\n'.join(lines)):
+            event_index = int(m.group(1))
+            values = sat_values if m.group(11) is not None else sop_values
+            # a repeated sop or sat is not counted, the event falls back to its raw comments
+            if event_index in values:
+                continue
+            match_counts[event_index] = match_counts.get(event_index, 0) + 1
+            if m.group(11) is not None:
+                sat_values[event_index] = float(m.group(11))
+                raw_comments.setdefault(event_index, ['', ''])[1] = m.group(0).split('\t', 1)[1]
+            else:
+                sop_values[event_index] = tuple(float(v) for v in m.groups()[1:10])
+                raw_comments.setdefault(event_index, ['', ''])[0] = m.group(0).split('\t', 1)[1]
+
+        for event_index in range(len(comment_lists)):
+            comments = asc_comments.get(event_index, ())
+            if len(comments) != match_counts.get(event_index, 0):
+                # unknown spelling, e.g. comma separated values, or a repeated sop or sat,
+                # keep the raw text like previous releases
+                logger.warning('Cannot parse asc comments, keeping raw text: {}'.format(' '.join(comments)))
+                table.raw_nuke_cc[event_index] = ''.join(
+                    comment if comment.startswith('* ASC_SOP') else ' ' + comment for comment in comments)
+                table.event_grades.append(-1)
+                continue
+            if event_index not in raw_comments:
+                table.event_grades.append(-1)
+                continue
+            sop = sop_values.get(event_index, _identity_sop)
+            sat = sat_values.get(event_index, _identity_sat)
+            sop_comment, sat_comment = raw_comments[event_index]
+            # keep the same nuke cc format as previous releases
+            if sop_comment and sat_comment:
+                nuke_cc = sop_comment + ' ' + sat_comment
+            else:
+                nuke_cc = sop_comment or ' ' + sat_comment
+            table.event_grades.append(table.add_grade(sop, sat, nuke_cc))
+
+        logger.info('Parsed {} unique grades from {} events'.format(len(table), len(comment_lists)))
+        return table
+
+    def add_grade(self, sop, sat, nuke_cc):
+        """Add a grade unless an identical one already exists.
+        :param sop: tuple of 9 floats, slope rgb, offset rgb, power rgb
+        :param sat: float
+        :param nuke_cc: str
+        :return: int grade id
+        """
+        key = tuple(sop) + (sat,)
+        grade_id = self._index.get(key)
+        if grade_id is None:
+            grade_id = len(self.saturation)
+            self._index[key] = grade_id
+            self.slope.extend(sop[0:3])
+            self.offset.extend(sop[3:6])
+            self.power.extend(sop[6:9])
+            self.saturation.append(sat)
+            self.nuke_cc.append(nuke_cc)
+        return grade_id
+
+    def grade(self, grade_id):
+        """Get the values of a grade.
+        :param grade_id: int
+        :return: tuple of slope, offset, power triplets and saturation
+        """
+        i = grade_id * 3
+        return (tuple(self.slope[i:i + 3]),
+                tuple(self.offset[i:i + 3]),
+                tuple(self.power[i:i + 3]),
+                self.saturation[grade_id])
+
+    def grade_id(self, event_index):
+        """Get the grade id of an event, None if the event has no grade.
+        :param event_index: int
+        :return: int or None
+        """
+        grade_id = self.event_grades[event_index]
+        if grade_id < 0:
+            return None
+        return grade_id
+
+    def nuke_cc_for_event(self, event_index):
+        """Get the nuke cc string of an event.
+        :param event_index: int
+        :return: str
+        """
+        grade_id = self.event_grades[event_index]
+        if grade_id < 0:
+            return self.raw_nuke_cc.get(event_index, NO_CDL)
+        return self.nuke_cc[grade_id]
+
+    def cc_id(self, grade_id, prefix):
+        """ColorCorrection id used in sidecar files.
+        :param grade_id: int
+        :param prefix: str
+        :return: str
+        """
+        return '{}_cc{:04d}'.format(prefix, grade_id)
+
+    def _cc_xml(self, grade_id, prefix, xmlns=''):
+        slope, offset, power, sat = self.grade(grade_id)
+        return _cc_template.format(xmlns=xmlns,
+                                   id=self.cc_id(grade_id, prefix),
+                                   slope=_format_triplet(slope),
+                                   offset=_format_triplet(offset),
+                                   power=_format_triplet(power),
+                                   sat='{:.6f}'.format(sat))
+
+    def write_ccc(self, file_path, prefix):
+        """Write all unique grades to a single .ccc collection file.
+        :param file_path: str
+        :param prefix: str
+        :return: str file path
+        """
+        lines = [_xml_header, '<ColorCorrectionCollection xmlns="{}">'.format(_cdl_ns)]
+        for grade_id in range(len(self)):
+            lines.extend('    ' + line for line in self._cc_xml(grade_id, prefix).split('\n'))
+        lines.append('</ColorCorrectionCollection>')
+        with open(file_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        return file_path
+
+    def write_cc_files(self, dir_path, prefix):
+        """Write one .cc file per unique grade.
+        :param dir_path: str
+        :param prefix: str
+        :return: list of file paths
+        """
+        if not os.path.isdir(dir_path):
+            os.makedirs(dir_path)
+        file_paths = list()
+        for grade_id in range(len(self)):
+            file_path = os.path.join(dir_path, self.cc_id(grade_id, prefix) + '.cc')
+            xml = self._cc_xml(grade_id, prefix, xmlns=' xmlns="{}"'.format(_cdl_ns))
+            with open(file_path, 'w') as f:
+                f.write(_xml_header + '\n' + xml + '\n')
+            file_paths.append(file_path)
+        return file_paths
+
+
+def _format_triplet(values):
+    return ' '.join('{:.6f}'.format(v) for v in values)
+
@@ -1,7 +1,6 @@
 # -*- coding: utf-8 -*-
 # Mind Machine customized
 
-from edl import Parser
 import re
 import sgtk
 import os
@@ -12,6 +11,15 @@ import threading
 # the code will be compatible with both PySide and PyQt.
 from sgtk.platform.qt import QtCore, QtGui
 from .ui.dialog import Ui_Dialog
+from .edl_events import RGX_CLIP_NAME, EventTable
+from .export import export_columns, export_rows
+from .field_mapping import PayloadBuilder
+from .planner import build_plan
+from .sg_cache import CodeCache
+from .scheduler import execute_plan
+from .sg_lookup import find_by_code
+from .table_index import FILTER_COLUMNS, TableIndex
+from .timecode import normalize_fps
 
 # standard toolkit logger
 logger = sgtk.platform.get_logger(__name__)
@@ -66,18 +74,40 @@ class AppDialog(QtGui.QWidget):
         self._app = sgtk.platform.current_bundle()
         self.ui.context.setText("Current Context: {}".format(self._app.context))
 
+        # filter bar above the table
+        self._create_filter_bar()
+
+        # export button below the import button
+        self.button_export = QtGui.QPushButton('Export Table', self)
+        self.button_export.setMinimumSize(QtCore.QSize(96, 0))
+        self.button_export.setMaximumSize(QtCore.QSize(96, 16777215))
+        self.ui.verticalLayout_1.insertWidget(self.ui.verticalLayout_1.indexOf(self.ui.button_shotgun_import) + 1,
+                                              self.button_export)
+        self.button_export.hide()
+
         # connect buttons
         self.ui.button_file_open.clicked.connect(self._select_edl_file)
         self.ui.button_shotgun_import.clicked.connect(self._shotgun_import)
+        self.button_export.clicked.connect(self._export_table)
+        self.ui.table.horizontalHeader().sectionClicked.connect(self._sort_table)
 
         # data
+        self.cdl_table = None
         self.edl_data = None
+        self.event_table = None
         self.element_list = list()
         self.first_time = True
-        self.fps = '23.976'
+        # project frame rate, empty detects the rate of every edl file
+        self.fps = normalize_fps(self._app.get_setting('fps')) if self._app.get_setting('fps') else None
         self.header_list = self.get_headers()
         self.last_edl_file_path = None
         self.output_file_name = None
+        self.plan = None
+        self.sort_column = None
+        self.sort_descending = False
+        self.table_index = None
+        self.table_rows = list()
+        self.visible_rows = None
         self.project = self._app.context.project
         self.project_name = self.project['name']
         self.user = self._app.context.user
@@ -86,7 +116,7 @@ class AppDialog(QtGui.QWidget):
             self.user_first_name = self.user['name'].split()[0]
 
         # regex to match groups in clip name
-        self.rgx_clip_name = re.compile('^RBW_([A-Z]{3}[0-9]{4})(\S*)(.*)$')
+        self.rgx_clip_name = RGX_CLIP_NAME
 
         # sg connection
         self.sg = self._app.shotgun
@@ -101,6 +131,28 @@ class AppDialog(QtGui.QWidget):
         msg = 'EDL Import app initialize by {}'.format(self.user['name'])
         logger.info(msg)
 
+    def _create_filter_bar(self):
+        """Add filter text and column selection above the table.
+        :return: None
+        """
+        self.filter_bar = QtGui.QWidget(self)
+        layout = QtGui.QHBoxLayout(self.filter_bar)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.filter_column = QtGui.QComboBox(self.filter_bar)
+        self.filter_column.addItem('All')
+        self.filter_column.addItems(list(FILTER_COLUMNS))
+        self.filter_text = QtGui.QLineEdit(self.filter_bar)
+        self.filter_text.setPlaceholderText('Filter by prefix')
+        layout.addWidget(QtGui.QLabel('Filter', self.filter_bar))
+        layout.addWidget(self.filter_column)
+        layout.addWidget(self.filter_text)
+        # insert below the progress bar, above the table
+        self.ui.verticalLayout_2.insertWidget(1, self.filter_bar)
+        self.filter_bar.hide()
+
+        self.filter_text.textChanged.connect(self._filter_table)
+        self.filter_column.currentIndexChanged.connect(self._filter_table)
+
     def _create_table(self):
 
         # set initial rows and columns
@@ -125,8 +177,14 @@ class AppDialog(QtGui.QWidget):
 
         logger.info('Adding EDL data to table')
 
+        # row data in table order, table row n is self.table_rows[n - 1]
+        self.table_rows = list()
+
         # add all rows of edl data to the table
         for row_num, shot_dict in enumerate(self.edl_data):
+            row_dict = dict(shot_dict)
+            row_dict['Entity Type'] = 'Element'
+            self.table_rows.append(row_dict)
             row_num += 1  # adjust for header row
             col_num = 0
             # use header names as keys
@@ -147,25 +205,21 @@ class AppDialog(QtGui.QWidget):
                 col_num += 1
 
         # create list of parents shots in table
-        parent_shot_list = list()
-        parent_shots_column = self.header_list.index('Parent Shots')
-        for row in range(1, self.ui.table.rowCount()+1):
-            item = self.ui.table.item(row, parent_shots_column)
-            if item and item.text():
-                parent_shot = item.text()
-                if parent_shot not in parent_shot_list:
-                    parent_shot_list.append(parent_shot)
-
-        # TODO: REMOVE THIS
+        parent_shot_list = self.event_table.parent_shot_codes()
+
         logger.info('Checking shotgun for existing parent shots')
 
-        # check shotgun for parent shots that may have been previously created
+        # check shotgun for parent shots that may have been previously created, all in one lookup
         # make a list of any shots that need to be created
+        code_cache = CodeCache.for_app(self._app, self.sg)
+        if code_cache:
+            code_cache.sync()
+        existing_shots = find_by_code(self.sg, self.project, 'Shot', parent_shot_list, cache=code_cache)
+        if code_cache:
+            code_cache.close()
         create_new_shot_list = list()
         for parent_shot in parent_shot_list:
-            # find in shotgun
-            shot = self.sg.find_one('Shot', [['project', 'is', self.project], ['code', 'is', parent_shot]])
-            if not shot and parent_shot not in create_new_shot_list:
+            if parent_shot not in existing_shots:
                 create_new_shot_list.append(parent_shot)
 
         logger.info('Adding parent shots to table')
@@ -198,6 +252,11 @@ class AppDialog(QtGui.QWidget):
                 if item.text() == 'Element':
                     break
             self.ui.table.insertRow(new_row_number)
+            self.table_rows.insert(new_row_number - 1, {'Episode': episode,
+                                                        'Sequence': sequence,
+                                                        'Shot Code': shot_name,
+                                                        'Entity Type': 'Shot',
+                                                        'Parent Shots': ''})
             # add new shot to table
             for header_name in self.header_list:
                 item = QtGui.QTableWidgetItem()
@@ -221,12 +280,28 @@ class AppDialog(QtGui.QWidget):
         # item.setFlags(QtCore.Qt.ItemIsSelectable)
         # set several flags
         # item.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsEditable)
+        self._create_table_index()
+
         self.setMinimumSize(1500, 540)
         self.resize(1500, 540)
+        self.filter_bar.show()
+        self.button_export.show()
         self.ui.button_file_open.hide()
         self.ui.button_shotgun_import.show()
         self.update()
 
+    def _create_table_index(self):
+        """Index table rows for filtering and sorting.
+        :return: None
+        """
+        self.table_index = TableIndex(self.header_list)
+        for row_num, row_dict in enumerate(self.table_rows):
+            self.table_index.add_row(row_num + 1, row_dict)
+        self.visible_rows = None
+        self.sort_column = None
+        self.sort_descending = False
+        self.filter_text.setText('')
+
     def _delete_table_rows(self):
         """Recursively delete table rows"""
         for row in range(self.ui.table.rowCount()):
@@ -234,6 +309,51 @@ class AppDialog(QtGui.QWidget):
         if self.ui.table.rowCount():
             self._delete_table_rows()
 
+    def _export_table(self):
+        """Stream the table row data and import results to a csv or json lines file.
+        :return: None
+        """
+        start_path = os.path.join(self.last_edl_file_path or os.path.expanduser('~'),
+                                  (self.output_file_name or 'edl_import') + '.csv')
+        try:
+            dial = QtGui.QFileDialog().getSaveFileName(self, u"Export table", start_path,
+                                                       "CSV (*.csv);;JSON Lines (*.jsonl)")
+        except IOError:
+            msg = 'ERROR: failed to get path from file dialog.'
+            logger.info(msg)
+            self.ui.label_status.setText(msg)
+            return
+        if not dial or not dial[0]:
+            return
+
+        try:
+            count = export_rows(self.table_rows, dial[0], export_columns(self.header_list))
+        except (IOError, OSError):
+            msg = 'ERROR: cannot write export file {}'.format(dial[0])
+            logger.info(msg)
+            self.ui.label_status.setText(msg)
+            return
+        self.ui.label_status.setText('Exported {} rows to {}'.format(count, dial[0]))
+
+    def _filter_table(self, *args):
+        """Show only rows matching the filter text, hide rows only when their visibility changes.
+        :return: None
+        """
+        if not self.table_index:
+            return
+        column = None
+        if self.filter_column.currentIndex() > 0:
+            column = self.filter_column.currentText()
+        rows = self.table_index.filter(self.filter_text.text(), column)
+
+        if self.visible_rows is None:
+            changed_rows = self.table_index.rows
+        else:
+            changed_rows = rows.symmetric_difference(self.visible_rows)
+        for row in changed_rows:
+            self.ui.table.setRowHidden(row, row not in rows)
+        self.visible_rows = rows
+
     def _fix_line_terminators(self, edl_file_path):
         """Fix line terminators to work on all platforms.
         :param edl_file_path: str
@@ -306,9 +426,9 @@ class AppDialog(QtGui.QWidget):
                 'Entity Type',
                 'Import']
 
-    def _parse_edl(self, edl_file_path):
-        """
-        :param edl_file_path: str
+    def _parse_edl(self, edl_file_paths):
+        """Parse one or more edl files and merge their events into a single table.
+        :param edl_file_paths: list of str
         :return:
         """
         if not self.first_time:
@@ -317,60 +437,17 @@ class AppDialog(QtGui.QWidget):
             self.element_list = list()
             self.output_file_name = None
 
-        self.output_file_name = os.path.basename(edl_file_path)[:-4].replace(' ', '_')
-
-        master_list = list()
-        element_list = list()
-
-        parser = Parser(self.fps)
-
-        with open(edl_file_path) as f:
-            edl = parser.parse(f)
-            for event in edl.events:
-                event_dict = dict()
-                event_dict['EDL Clip Name'] = str(event.reel)
-                event_dict['Cut Duration'] = str(event.rec_length() + 1)
-                event_dict['EDL Event Number'] = str(event.num)  # unused
-                event_dict['EDL Timecode Start'] = str(event.src_start_tc)
-                event_dict['EDL Timecode End'] = str(event.src_end_tc)
-                event_dict['EDL REC Timecode Start'] = str(event.rec_start_tc)
-                event_dict['EDL REC Timecode End'] = str(event.rec_end_tc)
-                # parse nuke cc data
-                nuke_cc = str()
-                for comment in event.comments:
-                    if comment.startswith('* ASC_SOP'):
-                        nuke_cc += str(comment)
-                    elif comment.startswith('* ASC_SAT'):
-                        nuke_cc += ' ' + str(comment)
-                if not nuke_cc:
-                    nuke_cc = 'unavailable'
-                event_dict['Nuke CC'] = nuke_cc
-                event_dict['Entity Type'] = 'Element'  # default entity type
-                event_dict['Parent Shots'] = ''
-                # parse shot name
-                m = self.rgx_clip_name.match(str(event.reel).strip())
-                if m:
-                    shot, element, extra = m.groups()
-                    shot = str(shot.strip())
-                    element = str(element.strip())
-                    extra = str(extra.strip())
-                    if element:
-                        shot_code = shot + element + extra
-                        event_dict['Parent Shots'] = shot
-                    else:
-                        shot_code = shot
-                        event_dict['Entity Type'] = 'Shot'
-                    event_dict['Shot Code'] = shot_code
-                    event_dict['Episode'] = shot_code[0:1]
-                    event_dict['Sequence'] = shot_code[0:3]
-                # if the shot does not have a parent, it is a master plate
-                if not event_dict['Parent Shots']:
-                    master_list.append(event_dict)
-                # otherwise, this is a shot element
-                else:
-                    element_list.append(event_dict)
+        self.output_file_name = os.path.basename(edl_file_paths[0])[:-4].replace(' ', '_')
+        if len(edl_file_paths) > 1:
+            self.output_file_name += '_merged'
 
-        event_list = master_list + element_list
+        self.event_table = EventTable(self.fps, self.rgx_clip_name)
+        self.event_table.load(edl_file_paths)
+        self.cdl_table = self.event_table.cdl_table
+        if self._app.get_setting('write_cdl_sidecars'):
+            self._write_cdl_sidecars(edl_file_paths[0])
+
+        event_list = self.event_table.rows
 
         if not event_list:
             msg = 'ERROR: no edl data'
@@ -383,14 +460,17 @@ class AppDialog(QtGui.QWidget):
         self._create_table()
 
         msg = 'Hey {}, good work!'.format(self.user_first_name)
+        if len(edl_file_paths) > 1:
+            msg += ' Merged {} EDLs, skipped {} duplicate events.'.format(len(edl_file_paths),
+                                                                      self.event_table.duplicate_count)
         self.ui.label_status.setText(msg)
 
     def _select_edl_file(self):
-        """Select edl file and parse it via self._edl_parse
+        """Select one or more edl files and parse them via self._parse_edl
         :return: None
         """
         logger.info('Starting EDL file selection')
-        self.ui.label_status.setText('Selecting EDL file')
+        self.ui.label_status.setText('Selecting EDL files')
 
         start_path = '~'
         if self.last_edl_file_path:
@@ -400,36 +480,38 @@ class AppDialog(QtGui.QWidget):
             if sys.platform == 'win32':
                 start_path = 'C:\\'
         try:
-            dial = QtGui.QFileDialog().getOpenFileName(self, u"Choose file", start_path, "*.edl")
+            dial = QtGui.QFileDialog().getOpenFileNames(self, u"Choose files", start_path, "*.edl")
         except IOError:
             msg = 'ERROR: failed to get path from file dialog.'
             logger.info(msg)
             self.ui.label_status.setText(msg)
             return
 
-        if dial and dial[0]:
-            self.last_edl_file_path = os.path.dirname(dial[0])
-            edl_file_path = self._fix_line_terminators(dial[0])
-            if edl_file_path:
-                if not os.path.exists(edl_file_path):
-                    msg = 'ERROR: eld file path does not exist.'
-                    logger.info(msg)
-                    self.ui.label_status.setText(msg)
-                    return
-                # success, parse edl file
-                self._parse_edl(edl_file_path)
-                return
-            else:
-                msg = 'ERROR: failed to get eld file path.'
-                logger.info(msg)
-                self.ui.label_status.setText(msg)
-                return
-        else:
+        if not dial or not dial[0]:
             msg = 'WARNING: no path from file dialog. User may have canceled.'
             logger.info(msg)
             self.ui.label_status.setText('')
             return
 
+        self.last_edl_file_path = os.path.dirname(dial[0][0])
+        edl_file_paths = list()
+        for selected_path in dial[0]:
+            edl_file_path = self._fix_line_terminators(selected_path)
+            if not edl_file_path:
+                msg = 'ERROR: failed to get eld file path.'
+                logger.info(msg)
+                self.ui.label_status.setText(msg)
+                return
+            if not os.path.exists(edl_file_path):
+                msg = 'ERROR: eld file path does not exist.'
+                logger.info(msg)
+                self.ui.label_status.setText(msg)
+                return
+            edl_file_paths.append(edl_file_path)
+
+        # success, parse all edl files
+        self._parse_edl(edl_file_paths)
+
     def _set_row_color(self, row, color_name):
         """Set row color based on name
         :param row: int
@@ -468,52 +550,44 @@ class AppDialog(QtGui.QWidget):
                 item.setBackground(row_color)
 
     def _shotgun_import(self):
-        """
+        """Plan the import on the first click, execute the reviewed plan on the second.
         :return:
         """
-        logger.info('Starting shotgun import process')
-
-        all_shot_data = list()
-        table_headers = list()
+        if self.plan:
+            self._start_thread(list(), self.plan)
+            return
 
-        # get table headers
-        for col in range(self.ui.table.columnCount()):
-            item = self.ui.table.item(0, col)
-            table_headers.append(item.text())
+        logger.info('Starting shotgun import planning')
 
-        import_column = table_headers.index('Import')
+        all_shot_data = list()
+        import_column = self.header_list.index('Import')
 
-        # loop through table and collect all shot data
-        for row in range(1, self.ui.table.rowCount()):
-            # determine if user wants to import shot
+        # collect all shot data from the table rows, the checkbox tells if the user wants to import
+        for row, row_dict in enumerate(self.table_rows, 1):
             checkbox = self.ui.table.cellWidget(row, import_column)
-            import_this_row = True
-            if not checkbox.isChecked():
-                import_this_row = False
-            # add data to dictionary
-            data_dict = dict()
-            for col in range(self.ui.table.columnCount()):
-                item = self.ui.table.item(row, col)
-                if item:
-                    val = item.text()
-                else:
-                    val = ''
-                if col == import_column:
-                    if import_this_row:
-                        val = 'YES'
-                    else:
-                        val = 'NO'
-                # use header name for dict key
-                k = table_headers[col]
-                data_dict[k] = val
+            data_dict = dict((k, row_dict.get(k) or '') for k in self.header_list)
+            data_dict['Import'] = 'YES' if checkbox.isChecked() else 'NO'
+            row_dict['Import'] = data_dict['Import']
             data_dict['row_number'] = row
             all_shot_data.append(data_dict)
+            # the plan is made for the current selection
+            checkbox.setEnabled(False)
+
+        self._start_thread(all_shot_data)
 
+    def _start_thread(self, shot_data_list, plan=None):
+        """Start the shotgun thread to plan or, given a plan, to execute it.
+        :param shot_data_list: list of dict
+        :param plan: ImportPlan or None
+        :return: None
+        """
         # close gui connection to shotgun, we'll use thread connection
         self.sg.close()
         self.sg = None
 
-        self.ui.progress_bar.setMaximum(len(all_shot_data))
+        row_count = len(plan.actions) if plan else len(shot_data_list)
+        self.ui.progress_bar.setValue(0)
+        self.ui.progress_bar.setMaximum(row_count)
         self.ui.progress_bar.update()
         self.ui.progress_bar.show()
         self.ui.button_shotgun_import.hide()
@@ -522,16 +596,41 @@ class AppDialog(QtGui.QWidget):
         logger.info(msg)
 
         # thread process data for shotgun
-        self._thread = SGProcessThread(shot_data_list=all_shot_data)
+        self._thread = SGProcessThread(shot_data_list=shot_data_list, plan=plan,
+                                       cut_events=self.event_table.events, fps=self.fps)
         self._thread.finished.connect(self._thread_notify_finish)
         self._thread.signal_from_thread.connect(self._thread_receive)
         self._thread.start()
 
+    def _sort_table(self, col):
+        """Sort table rows by a column, clicking the same column again reverses the order.
+        Only the visual order changes, logical rows stay in sync with self.table_rows.
+        :param col: int
+        :return: None
+        """
+        if not self.table_index or col >= len(self.header_list):
+            return
+        column = self.header_list[col]
+        if column == 'Import':
+            return
+        if column == self.sort_column:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_column = column
+            self.sort_descending = False
+
+        header = self.ui.table.verticalHeader()
+        # header row always stays on top
+        for visual_index, row in enumerate(self.table_index.sorted_rows(column, self.sort_descending), 1):
+            header.moveSection(header.visualIndex(row), visual_index)
+
     def _start_over(self):
         msg = 'EDL import complete'
         self.ui.label_status.setText(msg)
         self.ui.progress_bar.hide()
+        self.ui.button_shotgun_import.setText('Shotgun Import')
         self.ui.button_file_open.show()
+        self.plan = None
         self.sg = self._app.shotgun
         self.first_time = False
         self.update()
@@ -542,6 +641,9 @@ class AppDialog(QtGui.QWidget):
         self.ui.progress_bar.update()
         shot_name_column = self.get_headers().index('Shot Code')
         item = self.ui.table.item(count, shot_name_column)
+        if item and item.text() == shot_code and self.table_index:
+            self.table_index.set_value(count, 'Status', msg)
+            self.table_rows[count - 1]['Status'] = msg
         if item:
             if item.text() == shot_code and msg == 'imported':
                 self._set_row_color(count, 'green')
@@ -549,8 +651,12 @@ class AppDialog(QtGui.QWidget):
                 self._set_row_color(count, 'blue')
             elif item.text() == shot_code and msg == 'error':
                 self._set_row_color(count, 'red')
-            elif item.text() == shot_code and msg == 'test':
-                self._set_row_color(count, 'yellow')
+            elif item.text() == shot_code and msg == 'updated':
+                self._set_row_color(count, 'green')
+            elif item.text() == shot_code and msg == 'create':
+                self._set_row_color(count, 'violet')
+            elif item.text() == shot_code and msg == 'update':
+                self._set_row_color(count, 'ultra_violet')
             elif item.text() == shot_code and msg == 'skip':
                 self._set_row_color(count, 'dark gray')
         # set next row to bright green
@@ -562,27 +668,79 @@ class AppDialog(QtGui.QWidget):
         self.update()
 
     def _thread_notify_finish(self):
+        planning = self._thread.planning
+        plan = self._thread.plan
+        error = self._thread.error
         self._thread = None
         logger.info('Thread finished')
-        self._start_over()
+        if plan is None:
+            self._start_over()
+            self.ui.label_status.setText('ERROR: shotgun import failed: {}'.format(error))
+            return
+        if not planning:
+            # keep the id of every created or existing entity with the row data for exports
+            for row_dict in self.table_rows:
+                entity = plan.entities.get(row_dict.get('Entity Type'), dict()).get(row_dict.get('Shot Code'))
+                if entity:
+                    row_dict['Entity Id'] = entity['id']
+            self._start_over()
+            if error:
+                self.ui.label_status.setText('ERROR: shotgun import stopped: {}'.format(error))
+            return
+
+        # show the plan for review, the next click executes it
+        self.plan = plan
+        self.sg = self._app.shotgun
+        self.ui.progress_bar.hide()
+        self.ui.label_status.setText(plan.summary())
+        self.ui.button_shotgun_import.setText('Execute Plan')
+        self.ui.button_shotgun_import.show()
+        self.update()
 
     def _thread_send(self, shot_data_list):
         # send shot list to thread
         self.app_signals.from_gui.emit(shot_data_list)
 
+    def _write_cdl_sidecars(self, edl_file_path):
+        """Write .ccc and .cc files for all unique grades next to the processed edl file.
+        :param edl_file_path: str
+        :return: None
+        """
+        dir_path = os.path.dirname(edl_file_path)
+        ccc_file_path = os.path.join(dir_path, self.output_file_name + '.ccc')
+        cc_dir_path = os.path.join(dir_path, self.output_file_name + '_cc')
+        try:
+            self.cdl_table.write_ccc(ccc_file_path, self.output_file_name)
+            self.cdl_table.write_cc_files(cc_dir_path, self.output_file_name)
+        except (IOError, OSError):
+            msg = 'ERROR: cannot write cdl sidecar files'
+            logger.info(msg)
+            self.ui.label_status.setText(msg)
+            return
+        logger.info('Wrote {} grades to {}'.format(len(self.cdl_table), ccc_file_path))
+
 
 class SGProcessThread(QtCore.QThread):
-    """Thread to create/import elements and shots in Shotgun."""
+    """Thread to plan, then create/import elements and shots in Shotgun."""
 
     # note signal must be created before thread initialization
     signal_from_thread = QtCore.Signal(str, str, int)
 
-    def __init__(self, shot_data_list):
+    def __init__(self, shot_data_list, plan=None, cut_events=None, fps=None):
         """Initialize thread.
         :param shot_data_list: list of dictionaries
+        :param plan: ImportPlan to execute, when None the thread only plans
+        :param cut_events: list of edl event dicts recorded as cuts
+        :param fps: str
         """
         QtCore.QThread.__init__(self)
         self.shot_data_list = shot_data_list
+        self.cut_events = cut_events
+        self.fps = fps
+        self.plan = plan
+        self.planning = plan is None
+        # message of an error that stopped the thread
+        self.error = None
         self._app = sgtk.platform.current_bundle()
         self.project = self._app.context.project
         self.user = self._app.context.user
@@ -590,156 +748,45 @@ class SGProcessThread(QtCore.QThread):
         # sg connection
         self.sg = self._app.shotgun
 
-        # TODO: TURN OFF TEST MODE
-        self.test = True
-        if self.project['id'] == 243:  # TEST_DEV_01
-            self.test = False
+        # local code cache, opened in run since sqlite connections belong to one thread
+        self.code_cache = None
 
     def __del__(self):
         self.wait()
 
     def run(self):
-        """Process shot data, create new elements / shots in Shotgun.
+        """Plan the import with bulk lookups, or execute a reviewed plan in batches.
         :return: None
         """
-        for shot_data in self.shot_data_list:
-            # process depending on entity type
-            if shot_data['Entity Type'] == 'Element':
-                self.process_element(shot_data)
-            elif shot_data['Entity Type'] == 'Shot':
-                self.process_shot(shot_data)
-
-        self.sg.close()
-        self.sg = None
-
-    def process_element(self, element_data):
-        """
-        :param element_data: dict
-        :return: nothing
-        """
-        element_code = element_data['Shot Code']
-        row_number = element_data['row_number']
-
-        if self.test:
-            status = 'test'
-            self.signal_from_thread.emit(element_code, status, row_number)
-            return
-
-        if element_data['Import'] == 'NO':
-            status = 'skip'
-            self.signal_from_thread.emit(element_code, status, row_number)
-            return
-
-        # check if element already exists in shotgun
-        filters = [['code', 'is', element_code], ['project', 'is', self.project]]
-        result = self.sg.find_one('Element', filters, ['code'])
-        # if the element already exists don't process it
-        if result:
-            self.signal_from_thread.emit(element_code, 'exists', row_number)
-            return
-
-        # find parent shot
-        parent_shot = None
-
-        if element_data['Parent Shots']:
-            parent_shot_name = element_data['Parent Shots']
-            parent_filters = [['code', 'is', parent_shot_name], ['project', 'is', self.project]]
-            parent_shot = self.sg.find_one('Shot', parent_filters, ['code'])
-
-        # element creation data
-        element_create_data = {'code': element_code, 'project': self.project}
-        if element_data['Cut Duration']:
-            element_create_data['sg_cut_duration'] = int(element_data['Cut Duration'])
-        if element_data['EDL Clip Name']:
-            element_create_data['sg_edl_clip_name'] = element_data['EDL Clip Name']
-        if element_data['EDL Timecode Start']:
-            element_create_data['sg_edl_timecode_start'] = element_data['EDL Timecode Start']
-        if element_data['EDL Timecode End']:
-            element_create_data['sg_edl_timecode_end'] = element_data['EDL Timecode End']
-        if element_data['EDL REC Timecode Start']:
-            element_create_data['sg_edl_rec_timecode_start'] = element_data['EDL REC Timecode Start']
-        if element_data['EDL REC Timecode End']:
-            element_create_data['sg_edl_rec_timecode_end'] = element_data['EDL REC Timecode End']
-        if element_data['Nuke CC']:
-            element_create_data['sg_nuke_cc'] = element_data['Nuke CC']
-        if parent_shot:
-            element_create_data['shots'] = [parent_shot]
-
-        # create element
-        new_element = self.sg.create('Element', element_create_data)
-
-        status = 'imported'
-        if not new_element:
-            status = 'error'
-
-        self.signal_from_thread.emit(element_code, status, row_number)
-
-    def process_shot(self, shot_data):
-        """
-        :param shot_data:
-        :return: nothing
-        """
-        shot_code = shot_data['Shot Code']
-        row_number = shot_data['row_number']
-
-        if self.test:
-            status = 'test'
-            self.signal_from_thread.emit(shot_code, status, row_number)
-            return
+        self.code_cache = CodeCache.for_app(self._app, self.sg)
 
-        if shot_data['Import'] == 'NO':
-            status = 'skip'
-            self.signal_from_thread.emit(shot_code, status, row_number)
-            return
-
-        # check if shot already exists in shotgun
-        filters = [['code', 'is', shot_code], ['project', 'is', self.project]]
-        result = self.sg.find_one('Shot', filters, ['code'])
-
-        # if the shot already exists we don't need to process it
-        if result:
-            self.signal_from_thread.emit(shot_code, 'exists', row_number)
-            return
-
-        sequence_name = shot_data['Sequence']
-
-        # get the sequence
-        filters = [['code', 'is', sequence_name], ['project', 'is', self.project]]
-        sequence = self.sg.find_one('Sequence', filters, ['code', 'episode'])
-
-        # create new sequence if necessary
-        if not sequence:
-            seq_create_data = {'code': sequence_name, 'project': self.project}
-            sequence = self.sg.create('Sequence', seq_create_data, ['code', 'episode'])
-
-        if not sequence:
-            status = 'error'
-            self.signal_from_thread.emit(shot_code, status, row_number)
-            return
-
-        # shot creation data
-        shot_create_data = {'code': shot_code, 'project': self.project, 'sg_sequence': sequence}
-        if shot_data['Cut Duration']:
-            shot_create_data['sg_cut_duration'] = int(shot_data['Cut Duration'])
-        if shot_data['EDL Clip Name']:
-            shot_create_data['sg_edl_clip_name'] = shot_data['EDL Clip Name']
-        if shot_data['EDL Timecode Start']:
-            shot_create_data['sg_edl_timecode_start'] = shot_data['EDL Timecode Start']
-        if shot_data['EDL Timecode End']:
-            shot_create_data['sg_edl_timecode_end'] = shot_data['EDL Timecode End']
-        if shot_data['EDL REC Timecode Start']:
-            shot_create_data['sg_edl_rec_timecode_start'] = shot_data['EDL REC Timecode Start']
-        if shot_data['EDL REC Timecode End']:
-            shot_create_data['sg_edl_rec_timecode_end'] = shot_data['EDL REC Timecode End']
-        if shot_data['Nuke CC']:
-            shot_create_data['sg_nuke_cc'] = shot_data['Nuke CC']
-
-        # create shot
         try:
-            new_shot = self.sg.create('Shot', shot_create_data)
-            status = 'imported'
-            if not new_shot:
-                status = 'error'
-            self.signal_from_thread.emit(shot_code, status, row_number)
-        except sgtk.TankError:
-            self.signal_from_thread.emit(shot_code, 'error', row_number)
+            if self.planning:
+                if self.code_cache:
+                    self.code_cache.sync()
+                self.plan = build_plan(self.sg, self.project, self.shot_data_list, self.code_cache,
+                                       cut_events=self.cut_events, fps=self.fps,
+                                       payload_builder=PayloadBuilder.from_app(self._app))
+                for action in self.plan.actions:
+                    self.signal_from_thread.emit(action['code'], action['action'], action['row_number'])
+            else:
+                # toolkit shotgun connections are per thread, each scheduler worker gets its own
+                created = execute_plan(self.sg, self.plan, self.signal_from_thread.emit,
+                                       sg_factory=lambda: self._app.shotgun,
+                                       cut_item_element_field=self._app.get_setting('cut_item_element_field'))
+                if self.code_cache:
+                    for entity_type, code, entity in created:
+                        self.code_cache.add({'type': entity_type, 'id': entity['id'], 'code': code})
+        except Exception as e:
+            # the dialog must always get its state back, the error is shown when the thread finishes
+            logger.exception('Shotgun import failed')
+            self.error = str(e) or e.__class__.__name__
+            if self.planning:
+                self.plan = None
+        finally:
+            if self.code_cache:
+                self.code_cache.close()
+                self.code_cache = None
+
+            self.sg.close()
+            self.sg = None
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+# Mind Machine customized
+
+import os
+import re
+
+import sgtk
+
+from .cdl import CdlTable
+from .timecode import DEFAULT_FPS, DROP_FRAMES, detect_rate, get_table, normalize_fps
+
+# standard toolkit logger
+logger = sgtk.platform.get_logger(__name__)
+
+# regex to match groups in clip name
+RGX_CLIP_NAME = re.compile('^RBW_([A-Z]{3}[0-9]{4})(\S*)(.*)$')
+
+# regex to match event lines: number, reel, track, transition, optional transition duration,
+# then source in / out and record in / out timecodes as written in the edl
+_tc = r'(\d{2}:\d{2}:\d{2}[:;.,]\d{2})'
+rgx_event = re.compile(r'^\s*(\d+)\s+(\S+)\s+\S+\s+\S+\s+(?:\d+\s+)?' + r'\s+'.join([_tc] * 4))
+
+
+class EdlEvent(object):
+    """One edl event with its raw timecode strings and comments."""
+
+    __slots__ = ('num', 'reel', 'src_start_tc', 'src_end_tc', 'rec_start_tc', 'rec_end_tc', 'comments')
+
+    def __init__(self, num, reel, src_start_tc, src_end_tc, rec_start_tc, rec_end_tc):
+        self.num = num
+        self.reel = reel
+        self.src_start_tc = src_start_tc
+        self.src_end_tc = src_end_tc
+        self.rec_start_tc = rec_start_tc
+        self.rec_end_tc = rec_end_tc
+        self.comments = list()
+
+
+def parse_events(lines):
+    """Read the events of an edl. Timecodes are kept as written, drop frame or not, they are
+    converted to frames with the timecode table of the edl rate only.
+    :param lines: iterable of str
+    :return: list of EdlEvent
+    """
+    events = list()
+    for line in lines:
+        line = line.strip()
+        if line.startswith('*'):
+            # comments belong to the event above them
+            if events:
+                events[-1].comments.append('* ' + line[1:].strip())
+            continue
+        m = rgx_event.match(line)
+        if m:
+            events.append(EdlEvent(*m.groups()))
+    return events
+
+
+class EventTable(object):
+    """Events of one or more EDLs merged into a single table.
+
+    Rows are event dicts keyed by the dialog header names. A hash index on the shot code
+    makes sure a shot or element cut into several reels only shows up once.
+    """
+
+    def __init__(self, fps, rgx_clip_name):
+        """
+        :param fps: str frame rate of all edls, None to detect the rate of every edl file
+        :param rgx_clip_name: compiled regex with shot, element and extra groups
+        """
+        self.fps = normalize_fps(fps) if fps else None
+        self.rgx_clip_name = rgx_clip_name
+        self.cdl_table = CdlTable()
+        self.edl_file_paths = list()
+        # edl file name to (fps, drop frame), a delivery may mix rates
+        self.file_rates = dict()
+        # all events in edl order including duplicates, self.rows has each shot and element once
+        self.events = list()
+        self.rows = list()
+        self.duplicate_count = 0
+        # hash index of shot code to row
+        self._index = dict()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def load(self, edl_file_paths):
+        """Parse edl files and merge their events into the table.
+        :param edl_file_paths: list of str
+        :return: None
+        """
+        # read events of all reels first so all grades are parsed in one pass
+        events = list()
+        event_files = list()
+        for edl_file_path in edl_file_paths:
+            edl_file_name = os.path.basename(edl_file_path)
+            with open(edl_file_path) as f:
+                lines = f.readlines()
+            fps, drop = detect_rate(lines, self.fps or DEFAULT_FPS)
+            # the project rate overrides the detected one, drop frame is still read from the edl
+            if self.fps:
+                fps = self.fps
+                drop = drop and fps in DROP_FRAMES
+            elif fps == DEFAULT_FPS:
+                # no timecode told the rate apart, a 25 fps edl without frame 24 ends up here
+                logger.warning('Cannot detect the frame rate of {}, assuming {} fps, '
+                               'set the fps setting if the project uses another rate'.format(edl_file_path, fps))
+            file_events = parse_events(lines)
+            logger.info('Read {} events at {} fps{} from {}'.format(
+                len(file_events), fps, ' drop frame' if drop else '', edl_file_path))
+            self.file_rates[edl_file_name] = (fps, drop)
+            events.extend(file_events)
+            event_files.extend([edl_file_name] * len(file_events))
+            self.edl_file_paths.append(edl_file_path)
+
+        # parse asc cdl values for all events at once, identical grades share one entry
+        self.cdl_table = CdlTable.from_comments([event.comments for event in events])
+
+        master_list = list()
+        element_list = list()
+        for event_index, event in enumerate(events):
+            event_dict = self._event_dict(event, event_index, *self.file_rates[event_files[event_index]])
+            event_dict['EDL File'] = event_files[event_index]
+            self.events.append(event_dict)
+
+            # skip shots and elements already cut in by a previous event or reel
+            shot_code = event_dict.get('Shot Code')
+            if shot_code:
+                if shot_code in self._index:
+                    self.duplicate_count += 1
+                    continue
+                self._index[shot_code] = event_dict
+
+            # if the shot does not have a parent, it is a master plate
+            if not event_dict['Parent Shots']:
+                master_list.append(event_dict)
+            # otherwise, this is a shot element
+            else:
+                element_list.append(event_dict)
+
+        self.rows = master_list + element_list
+
+        logger.info('Merged {} events from {} edl files into {} rows, {} duplicates skipped'.format(
+            len(events), len(edl_file_paths), len(self.rows), self.duplicate_count))
+
+    def _event_dict(self, event, event_index, fps, drop):
+        """Convert an edl event into a row dict.
+        :param event: EdlEvent
+        :param event_index: int index into the cdl table
+        :param fps: str frame rate of the edl file
+        :param drop: bool
+        :return: dict
+        """
+        timecodes = get_table(fps, drop)
+        event_dict = dict()
+        event_dict['EDL Clip Name'] = str(event.reel)
+        event_dict['EDL Event Number'] = str(event.num)
+        event_dict['EDL Timecode Start'] = str(event.src_start_tc)
+        event_dict['EDL Timecode End'] = str(event.src_end_tc)
+        event_dict['EDL REC Timecode Start'] = str(event.rec_start_tc)
+        event_dict['EDL REC Timecode End'] = str(event.rec_end_tc)
+        event_dict['Cut Duration'] = str(timecodes.duration(event_dict['EDL REC Timecode Start'],
+                                                            event_dict['EDL REC Timecode End']) + 1)
+        # frame numbers for cut items, converted with the table of the edl rate
+        event_dict['FPS'] = fps
+        event_dict['Drop Frame'] = drop
+        event_dict['EDL Frame Start'] = timecodes.to_frames(event_dict['EDL Timecode Start'])
+        event_dict['EDL Frame End'] = timecodes.to_frames(event_dict['EDL Timecode End'])
+        event_dict['EDL REC Frame Start'] = timecodes.to_frames(event_dict['EDL REC Timecode Start'])
+        event_dict['EDL REC Frame End'] = timecodes.to_frames(event_dict['EDL REC Timecode End'])
+        # nuke cc string is shared by all events with the same grade
+        event_dict['Nuke CC'] = self.cdl_table.nuke_cc_for_event(event_index)
+        event_dict['CDL Id'] = self.cdl_table.grade_id(event_index)
+        event_dict['Entity Type'] = 'Element'  # default entity type
+        event_dict['Parent Shots'] = ''
+        # parse shot name
+        m = self.rgx_clip_name.match(str(event.reel).strip())
+        if m:
+            shot, element, extra = m.groups()
+            shot = str(shot.strip())
+            element = str(element.strip())
+            extra = str(extra.strip())
+            if element:
+                shot_code = shot + element + extra
+                event_dict['Parent Shots'] = shot
+            else:
+                shot_code = shot
+                event_dict['Entity Type'] = 'Shot'
+            event_dict['Shot Code'] = shot_code
+            event_dict['Episode'] = shot_code[0:1]
+            event_dict['Sequence'] = shot_code[0:3]
+        return event_dict
+
+    def row(self, shot_code):
+        """Get the row of a shot or element.
+        :param shot_code: str
+        :return: dict or None
+        """
+        return self._index.get(shot_code)
+
+    def import_rows(self, existing_shot_codes):
+        """Rows to import without the dialog, the same rows the dialog table holds: parent shots
+        missing from shotgun first, then every edl event as an element.
+        :param existing_shot_codes: collection of str parent shot codes found in shotgun
+        :return: list of dict with row_number and Import set
+        """
+        # first element row of every parent shot, episode and sequence are taken from it
+        first_child_rows = dict()
+        for event_dict in self.rows:
+            if event_dict['Parent Shots']:
+                first_child_rows.setdefault(event_dict['Parent Shots'], event_dict)
+
+        rows = list()
+        for parent_shot in self.parent_shot_codes():
+            # every edl event is imported as an element, a master plate does not create its shot
+            if parent_shot in existing_shot_codes:
+                continue
+            parent_row = first_child_rows[parent_shot]
+            rows.append({'Episode': parent_row.get('Episode', ''),
+                         'Sequence': parent_row.get('Sequence', ''),
+                         'Shot Code': parent_shot,
+                         'Entity Type': 'Shot',
+                         'Parent Shots': ''})
+        for event_dict in self.rows:
+            row_dict = dict(event_dict)
+            row_dict['Entity Type'] = 'Element'
+            rows.append(row_dict)
+        for row_number, row_dict in enumerate(rows, 1):
+            row_dict['row_number'] = row_number
+            row_dict['Import'] = 'YES'
+        return rows
+
+    def parent_shot_codes(self):
+        """Unique parent shot codes in table order.
+        :return: list of str
+        """
+        parent_shot_list = list()
+        seen = set()
+        for event_dict in self.rows:
+            parent_shot = event_dict['Parent Shots']
+            if parent_shot and parent_shot not in seen:
+                seen.add(parent_shot)
+                parent_shot_list.append(parent_shot)
+        return parent_shot_list
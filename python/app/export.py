@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# Mind Machine customized
+
+import csv
+import io
+import json
+import os
+import sys
+
+import sgtk
+
+# standard toolkit logger
+logger = sgtk.platform.get_logger(__name__)
+
+# columns added to the table headers in exports
+RESULT_COLUMNS = ['EDL File', 'EDL Event Number', 'CDL Id', 'Status', 'Entity Id']
+
+CSV = 'csv'
+JSON_LINES = 'jsonl'
+
+
+def export_columns(header_list):
+    """Columns of an export, table headers followed by the import results.
+    :param header_list: list of str
+    :return: list of str
+    """
+    return list(header_list) + [c for c in RESULT_COLUMNS if c not in header_list]
+
+
+def export_format(file_path):
+    """
+    :param file_path: str
+    :return: str CSV or JSON_LINES
+    """
+    if os.path.splitext(file_path)[1].lower() in ('.jsonl', '.json'):
+        return JSON_LINES
+    return CSV
+
+
+def iter_records(rows, columns):
+    """Yield one record per row with a value for every column, rows are never copied as a whole.
+    :param rows: iterable of dict
+    :param columns: list of str
+    :return: generator of dict
+    """
+    for row in rows:
+        record = dict()
+        for column in columns:
+            value = row.get(column)
+            record[column] = '' if value is None else value
+        yield record
+
+
+def _open_csv(file_path):
+    if sys.version_info[0] < 3:
+        return open(file_path, 'wb')
+    return io.open(file_path, 'w', newline='', encoding='utf-8')
+
+
+def export_rows(rows, file_path, columns):
+    """Stream rows to a csv or json lines file, picked by the file extension.
+    :param rows: iterable of dict
+    :param file_path: str
+    :param columns: list of str
+    :return: int number of rows written
+    """
+    count = 0
+    if export_format(file_path) == JSON_LINES:
+        with io.open(file_path, 'w', encoding='utf-8') as f:
+            for record in iter_records(rows, columns):
+                line = json.dumps(record, ensure_ascii=False, sort_keys=True)
+                if not isinstance(line, type(u'')):
+                    line = line.decode('utf-8')
+                f.write(line + u'\n')
+                count += 1
+    else:
+        with _open_csv(file_path) as f:
+            writer = csv.DictWriter(f, columns)
+            writer.writeheader()
+            for record in iter_records(rows, columns):
+                writer.writerow(record)
+                count += 1
+
+    logger.info('Exported {} rows to {}'.format(count, file_path))
+    return count
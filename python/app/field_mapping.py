@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# Mind Machine customized
+
+import sgtk
+
+# standard toolkit logger
+logger = sgtk.platform.get_logger(__name__)
+
+# converters available to field mappings, by name
+CONVERTERS = {
+    'str': lambda value: value,
+    'int': int,
+    'float': float,
+}
+
+# table column to shotgun field per entity type, used when the field_mapping setting is empty
+_edl_fields = [
+    {'column': 'Cut Duration', 'field': 'sg_cut_duration', 'type': 'int'},
+    {'column': 'EDL Clip Name', 'field': 'sg_edl_clip_name', 'type': 'str'},
+    {'column': 'EDL Timecode Start', 'field': 'sg_edl_timecode_start', 'type': 'str'},
+    {'column': 'EDL Timecode End', 'field': 'sg_edl_timecode_end', 'type': 'str'},
+    {'column': 'EDL REC Timecode Start', 'field': 'sg_edl_rec_timecode_start', 'type': 'str'},
+    {'column': 'EDL REC Timecode End', 'field': 'sg_edl_rec_timecode_end', 'type': 'str'},
+    {'column': 'Nuke CC', 'field': 'sg_nuke_cc', 'type': 'str'},
+]
+DEFAULT_FIELD_MAPPING = {
+    'Element': _edl_fields,
+    'Shot': _edl_fields,
+}
+
+
+class PayloadBuilder(object):
+    """Shotgun payloads built from table rows with a declarative field mapping.
+
+    The mapping is a dict of entity type to a list of ``{column, field, type}`` dicts. It is
+    compiled once into (column, field, converter) tuples, empty values are left out of payloads.
+    A row with a value its converter rejects gets no payload, None, instead of failing the batch.
+    """
+
+    def __init__(self, mapping=None):
+        """
+        :param mapping: dict, defaults to DEFAULT_FIELD_MAPPING
+        """
+        self.mapping = mapping or DEFAULT_FIELD_MAPPING
+        self._compiled = dict()
+        for entity_type, field_list in self.mapping.items():
+            compiled = list()
+            for field_map in field_list:
+                if not isinstance(field_map, dict) or not field_map.get('column') or not field_map.get('field'):
+                    raise sgtk.TankError('Field mapping entry {!r} of {} needs a column and a field'.format(
+                        field_map, entity_type))
+                converter_name = field_map.get('type', 'str')
+                if converter_name not in CONVERTERS:
+                    raise sgtk.TankError('Unknown type {} for field {} in field mapping'.format(
+                        converter_name, field_map['field']))
+                compiled.append((field_map['column'], field_map['field'], CONVERTERS[converter_name]))
+            self._compiled[entity_type] = tuple(compiled)
+
+    @classmethod
+    def from_app(cls, app):
+        """Builder with the field_mapping setting of the app.
+        :param app: sgtk Application
+        :return: PayloadBuilder
+        """
+        return cls(app.get_setting('field_mapping'))
+
+    def fields(self, entity_type):
+        """Shotgun fields written for an entity type.
+        :param entity_type: str
+        :return: list of str
+        """
+        return [field for column, field, converter in self._compiled.get(entity_type, ())]
+
+    def payload(self, entity_type, row_data):
+        """
+        :param entity_type: str
+        :param row_data: dict
+        :return: dict or None if a value cannot be converted
+        """
+        return self._payload(self._compiled.get(entity_type, ()), row_data)
+
+    def payloads(self, entity_type, rows):
+        """Payloads of a whole batch of rows in one pass.
+        :param entity_type: str
+        :param rows: iterable of dict
+        :return: list of dict or None for rows with a value that cannot be converted
+        """
+        compiled = self._compiled.get(entity_type, ())
+        return [self._payload(compiled, row_data) for row_data in rows]
+
+    @staticmethod
+    def _payload(compiled, row_data):
+        data = dict()
+        for column, field, converter in compiled:
+            value = row_data.get(column)
+            if not value:
+                continue
+            try:
+                data[field] = converter(value)
+            except (TypeError, ValueError) as e:
+                logger.warning('Cannot convert {} {!r} of {} for field {}: {}'.format(
+                    column, value, row_data.get('Shot Code'), field, e))
+                return None
+        return data
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+# Mind Machine customized
+
+import os
+
+import sgtk
+
+from .field_mapping import PayloadBuilder
+from .sg_lookup import find_by_code
+
+# standard toolkit logger
+logger = sgtk.platform.get_logger(__name__)
+
+# max number of create / update requests sent in one sg.batch call
+BATCH_SIZE = 50
+
+# planned actions per row
+CREATE = 'create'
+UPDATE = 'update'
+EXISTS = 'exists'
+SKIP = 'skip'
+ERROR = 'error'
+
+
+def _batch_count(request_count, batch_size):
+    return (request_count + batch_size - 1) // batch_size
+
+
+class ImportPlan(object):
+    """Planned creates, updates and skips for every table row.
+
+    Each action is a dict with row_number, code, entity_type, action, data, entity,
+    sequence and parent_shot.
+    Links to sequences and parent shots are kept as codes and resolved when the plan is
+    executed, once the ids of entities created earlier in the plan are known.
+    """
+
+    def __init__(self, project, batch_size=BATCH_SIZE):
+        """
+        :param project: dict project entity
+        :param batch_size: int
+        """
+        self.project = project
+        self.batch_size = batch_size
+        self.actions = list()
+        # existing entities by type and code, filled by the lookup and by execution
+        self.entities = {'Cut': dict(), 'Element': dict(), 'Sequence': dict(), 'Shot': dict()}
+        self.sequences_to_create = list()
+        # one cut per edl file and one cut item per edl event, see plan_cuts
+        self.cuts = list()
+        self.cut_items = list()
+
+    def count(self, action, entity_type=None):
+        """Number of planned actions of a kind.
+        :param action: str
+        :param entity_type: str or None for all types
+        :return: int
+        """
+        return len([a for a in self.actions
+                    if a['action'] == action and (entity_type is None or a['entity_type'] == entity_type)])
+
+    def requests(self, entity_type):
+        """Planned create and update actions of an entity type.
+        :param entity_type: str
+        :return: list of dict
+        """
+        return [a for a in self.actions if a['entity_type'] == entity_type and a['action'] in (CREATE, UPDATE)]
+
+    @property
+    def request_count(self):
+        """Number of create and update requests the plan will send.
+        :return: int
+        """
+        return (len(self.cuts) + len(self.sequences_to_create) + self.count(CREATE) + self.count(UPDATE) +
+                len(self.cut_items))
+
+    @property
+    def batch_count(self):
+        """Minimum number of sg.batch calls the plan needs, when cuts and sequences, shots, elements
+        and cut items each fill full batches. The scheduler may send more, smaller batches to
+        release dependent rows earlier.
+        :return: int
+        """
+        return (_batch_count(len(self.cuts) + len(self.sequences_to_create), self.batch_size) +
+                _batch_count(len(self.requests('Shot')), self.batch_size) +
+                _batch_count(len(self.requests('Element')), self.batch_size) +
+                _batch_count(len(self.cut_items), self.batch_size))
+
+    def summary(self):
+        """
+        :return: str
+        """
+        return ('Plan: {} creates, {} updates, {} existing, {} skips, {} errors, {} new sequences, '
+                '{} cuts with {} cut items. {} API requests in {} batches.').format(
+            self.count(CREATE), self.count(UPDATE), self.count(EXISTS), self.count(SKIP), self.count(ERROR),
+            len(self.sequences_to_create), len(self.cuts), len(self.cut_items),
+            self.request_count, self.batch_count)
+
+
+def build_plan(sg, project, shot_data_list, code_cache=None, batch_size=BATCH_SIZE, cut_events=None, fps=None,
+               payload_builder=None):
+    """Plan the import of all table rows with bulk lookups, nothing is written to shotgun.
+    :param sg: shotgun connection
+    :param project: dict project entity
+    :param shot_data_list: list of dict table rows with row_number and Import YES / NO
+    :param code_cache: synced CodeCache or None
+    :param batch_size: int
+    :param cut_events: list of edl event dicts with EDL File, recorded as cuts when given
+    :param fps: str frame rate of the cuts
+    :param payload_builder: PayloadBuilder, defaults to the default field mapping
+    :return: ImportPlan
+    """
+    plan = ImportPlan(project, batch_size)
+    payload_builder = payload_builder or PayloadBuilder()
+
+    codes = {'Element': set(), 'Sequence': set(), 'Shot': set()}
+    for shot_data in shot_data_list:
+        if shot_data['Entity Type'] == 'Element':
+            codes['Element'].add(shot_data['Shot Code'])
+            codes['Shot'].add(shot_data['Parent Shots'])
+        elif shot_data['Entity Type'] == 'Shot':
+            codes['Shot'].add(shot_data['Shot Code'])
+            codes['Sequence'].add(shot_data['Sequence'])
+
+    for entity_type in codes:
+        plan.entities[entity_type] = find_by_code(sg, project, entity_type, codes[entity_type], cache=code_cache)
+
+    # fetch current field values of existing rows only, to tell updates from unchanged entities
+    # sequences are only fetched to confirm cache hits
+    current = dict()
+    for entity_type in ('Element', 'Sequence', 'Shot'):
+        if entity_type == 'Sequence' and code_cache is None:
+            continue
+        existing_codes = [code for code in codes[entity_type] if code in plan.entities[entity_type]]
+        fields = payload_builder.fields(entity_type) if entity_type != 'Sequence' else None
+        current[entity_type] = find_by_code(sg, project, entity_type, existing_codes, fields)
+
+        # cache hits are only trusted when shotgun still has them, retired entities are created again
+        if code_cache is not None:
+            for code in existing_codes:
+                cached = plan.entities[entity_type][code]
+                entity = current[entity_type].get(code)
+                if entity and entity['id'] == cached['id']:
+                    continue
+                logger.warning('Cached {} {} id {} is not in shotgun anymore'.format(entity_type, code, cached['id']))
+                code_cache.remove(entity_type, cached['id'])
+                if entity:
+                    code_cache.add({'type': entity_type, 'id': entity['id'], 'code': code})
+                    plan.entities[entity_type][code] = {'type': entity_type, 'id': entity['id'], 'code': code}
+                else:
+                    del plan.entities[entity_type][code]
+
+    # payloads of all rows, one pass per entity type
+    payloads = dict()
+    for entity_type in ('Element', 'Shot'):
+        rows = [shot_data for shot_data in shot_data_list if shot_data['Entity Type'] == entity_type]
+        for shot_data, data in zip(rows, payload_builder.payloads(entity_type, rows)):
+            payloads[shot_data['row_number']] = data
+
+    planned_codes = set()
+    planned_sequences = set()
+    for shot_data in shot_data_list:
+        entity_type = shot_data['Entity Type']
+        if entity_type not in ('Element', 'Shot'):
+            continue
+        code = shot_data['Shot Code']
+        action = {'row_number': shot_data['row_number'],
+                  'code': code,
+                  'entity_type': entity_type,
+                  'action': SKIP,
+                  'data': None,
+                  'entity': plan.entities[entity_type].get(code),
+                  'sequence': None,
+                  'parent_shot': None}
+        plan.actions.append(action)
+
+        if shot_data['Import'] == 'NO' or not code or (entity_type, code) in planned_codes:
+            continue
+        planned_codes.add((entity_type, code))
+
+        data = payloads[shot_data['row_number']]
+        # a value the field mapping cannot convert fails only its own row
+        if data is None:
+            action['action'] = ERROR
+            continue
+        if action['entity']:
+            existing = current[entity_type].get(code, dict())
+            changed = dict((k, v) for k, v in data.items() if existing.get(k) != v)
+            if changed:
+                action['action'] = UPDATE
+                action['data'] = changed
+            else:
+                action['action'] = EXISTS
+            continue
+
+        action['action'] = CREATE
+        data['code'] = code
+        data['project'] = project
+        action['data'] = data
+        if entity_type == 'Shot':
+            action['sequence'] = shot_data['Sequence']
+            if shot_data['Sequence'] not in plan.entities['Sequence'] and \
+                    shot_data['Sequence'] not in planned_sequences:
+                planned_sequences.add(shot_data['Sequence'])
+                plan.sequences_to_create.append(shot_data['Sequence'])
+        else:
+            action['parent_shot'] = shot_data['Parent Shots']
+
+    if cut_events:
+        plan_cuts(sg, plan, cut_events, fps)
+
+    logger.info(plan.summary())
+    return plan
+
+
+def plan_cuts(sg, plan, cut_events, fps=None):
+    """Plan a new Cut revision per edl file with one CutItem per event.
+    :param sg: shotgun connection
+    :param plan: ImportPlan
+    :param cut_events: list of edl event dicts with EDL File
+    :param fps: str frame rate of cuts whose events have no FPS
+    :return: None
+    """
+    cut_codes = list()
+    cut_rates = dict()
+    for event_dict in cut_events:
+        cut_code = os.path.splitext(event_dict['EDL File'])[0]
+        if cut_code not in cut_codes:
+            cut_codes.append(cut_code)
+            cut_rates[cut_code] = event_dict.get('FPS') or fps
+
+    # every import of an edl records a new revision of its cut
+    revisions = dict()
+    filters = [['project', 'is', plan.project], ['code', 'in', cut_codes]]
+    for cut in sg.find('Cut', filters, ['code', 'revision_number']):
+        revisions[cut['code']] = max(revisions.get(cut['code'], 0), cut.get('revision_number') or 0)
+
+    for cut_code in cut_codes:
+        data = {'code': cut_code, 'project': plan.project, 'revision_number': revisions.get(cut_code, 0) + 1}
+        if cut_rates[cut_code]:
+            data['fps'] = float(cut_rates[cut_code])
+        plan.cuts.append(data)
+
+    for event_dict in cut_events:
+        data = {'project': plan.project,
+                'code': event_dict.get('Shot Code') or event_dict['EDL Clip Name'],
+                'timecode_cut_item_in_text': event_dict['EDL Timecode Start'],
+                'timecode_cut_item_out_text': event_dict['EDL Timecode End'],
+                'timecode_edit_in_text': event_dict['EDL REC Timecode Start'],
+                'timecode_edit_out_text': event_dict['EDL REC Timecode End']}
+        if event_dict.get('EDL Event Number', '').isdigit():
+            data['cut_order'] = int(event_dict['EDL Event Number'])
+        if event_dict.get('Cut Duration'):
+            data['cut_item_duration'] = int(event_dict['Cut Duration'])
+        # record frames of the edit, cut_item_in and out are shot frames and left to the shot setup
+        if 'EDL REC Frame Start' in event_dict:
+            data['edit_in'] = event_dict['EDL REC Frame Start']
+            data['edit_out'] = event_dict['EDL REC Frame End']
+        plan.cut_items.append({'cut': os.path.splitext(event_dict['EDL File'])[0],
+                               'code': event_dict.get('Shot Code'),
+                               'parent_shot': event_dict.get('Parent Shots'),
+                               'data': data})
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+# Mind Machine customized
+
+from collections import deque
+import threading
+
+import sgtk
+from tank_vendor import shotgun_api3
+
+from .planner import CREATE, ERROR, EXISTS, SKIP, UPDATE
+
+# standard toolkit logger
+logger = sgtk.platform.get_logger(__name__)
+
+# number of threads sending batches in parallel
+MAX_WORKERS = 4
+
+
+class ImportScheduler(object):
+    """Execute an ImportPlan along its dependency graph, Sequence, then Shot, then Element.
+
+    Every request is a node that becomes ready once the entities it links to are created.
+    Workers send ready nodes in batches, so an element is released as soon as its parent
+    shot id is known and independent branches are sent in parallel.
+    """
+
+    def __init__(self, plan, callback, sg_factory, workers=MAX_WORKERS, cut_item_element_field=None):
+        """
+        :param plan: ImportPlan
+        :param callback: function(code, status, row_number) called for every row
+        :param sg_factory: function returning a shotgun connection, called once per worker thread
+        :param workers: int
+        :param cut_item_element_field: str custom CutItem field linking elements, None to not link them
+        """
+        self.plan = plan
+        self.callback = callback
+        self.sg_factory = sg_factory
+        self.workers = workers
+        self.cut_item_element_field = cut_item_element_field
+        self.created = list()
+        self._cond = threading.Condition()
+        self._ready = deque()
+        # dependency key (entity type, code) to nodes waiting for it
+        self._waiting = dict()
+        self._remaining = 0
+
+    def _add_node(self, node, deps):
+        """
+        :param node: dict with kind, key and action or cut_item
+        :param deps: set of (entity type, code) created by other nodes
+        :return: None
+        """
+        node['deps'] = deps
+        self._remaining += 1
+        if not deps:
+            self._ready.append(node)
+        for dep in deps:
+            self._waiting.setdefault(dep, list()).append(node)
+
+    def _build_graph(self):
+        plan = self.plan
+        planned_sequences = set(plan.sequences_to_create)
+        planned_shots = set(a['code'] for a in plan.requests('Shot') if a['action'] == CREATE)
+        planned_elements = set(a['code'] for a in plan.requests('Element') if a['action'] == CREATE)
+
+        for data in plan.cuts:
+            self._add_node({'kind': 'Cut', 'key': ('Cut', data['code']), 'data': data}, set())
+        for code in plan.sequences_to_create:
+            data = {'code': code, 'project': plan.project}
+            self._add_node({'kind': 'Sequence', 'key': ('Sequence', code), 'data': data}, set())
+
+        for action in plan.actions:
+            deps = set()
+            if action['action'] == CREATE:
+                if action['entity_type'] == 'Shot' and action['sequence'] in planned_sequences:
+                    deps.add(('Sequence', action['sequence']))
+                elif action['entity_type'] == 'Element' and action['parent_shot'] in planned_shots:
+                    deps.add(('Shot', action['parent_shot']))
+            elif action['action'] != UPDATE:
+                continue
+            key = (action['entity_type'], action['code']) if action['action'] == CREATE else None
+            self._add_node({'kind': action['entity_type'], 'key': key, 'action': action}, deps)
+
+        for cut_item in plan.cut_items:
+            deps = set([('Cut', cut_item['cut'])])
+            if cut_item['code'] in planned_elements:
+                deps.add(('Element', cut_item['code']))
+            for code in (cut_item['code'], cut_item['parent_shot']):
+                if code in planned_shots:
+                    deps.add(('Shot', code))
+            self._add_node({'kind': 'CutItem', 'key': None, 'cut_item': cut_item}, deps)
+
+    def _request(self, node):
+        """Build the batch request of a ready node, links are resolved from plan entities.
+        :param node: dict
+        :return: dict or None if the node cannot be sent
+        """
+        entities = self.plan.entities
+        if node['kind'] in ('Cut', 'Sequence'):
+            return {'request_type': 'create', 'entity_type': node['kind'], 'data': node['data']}
+
+        if node['kind'] == 'CutItem':
+            cut_item = node['cut_item']
+            cut = entities['Cut'].get(cut_item['cut'])
+            if not cut:
+                return None
+            data = dict(cut_item['data'])
+            data['cut'] = {'type': 'Cut', 'id': cut['id']}
+            element = entities['Element'].get(cut_item['code'])
+            shot = entities['Shot'].get(cut_item['code']) or entities['Shot'].get(cut_item['parent_shot'])
+            if element and self.cut_item_element_field:
+                data[self.cut_item_element_field] = {'type': 'Element', 'id': element['id']}
+            if shot:
+                data['shot'] = {'type': 'Shot', 'id': shot['id']}
+            return {'request_type': 'create', 'entity_type': 'CutItem', 'data': data}
+
+        action = node['action']
+        if action['action'] == UPDATE:
+            return {'request_type': 'update',
+                    'entity_type': action['entity_type'],
+                    'entity_id': action['entity']['id'],
+                    'data': action['data']}
+
+        data = dict(action['data'])
+        if action['entity_type'] == 'Shot':
+            sequence = entities['Sequence'].get(action['sequence'])
+            if not sequence:
+                return None
+            data['sg_sequence'] = {'type': 'Sequence', 'id': sequence['id']}
+        else:
+            # parent entity is passed straight into the link, no lookup needed
+            parent_shot = entities['Shot'].get(action['parent_shot'])
+            if parent_shot:
+                data['shots'] = [{'type': 'Shot', 'id': parent_shot['id']}]
+        return {'request_type': 'create', 'entity_type': action['entity_type'], 'data': data}
+
+    def _finish(self, node, result):
+        """Record the result of a node and release nodes waiting for it, call with the lock held.
+        :param node: dict
+        :param result: dict entity or None on failure
+        :return: None
+        """
+        self._remaining -= 1
+        if node['key'] and result:
+            self.plan.entities[node['kind']][node['key'][1]] = result
+            if node['kind'] != 'Cut':
+                self.created.append((node['kind'], node['key'][1], result))
+
+        action = node.get('action')
+        if action:
+            if not result:
+                status = 'error'
+            elif action['action'] == UPDATE:
+                status = 'updated'
+            else:
+                status = 'imported'
+            self.callback(action['code'], status, action['row_number'])
+        elif not result:
+            logger.error('Failed to create {} {}'.format(node['kind'], node['key'] or ''))
+
+        # dependents are released on failure too, they resolve their links without this entity
+        for waiting_node in self._waiting.pop(node['key'], list()):
+            waiting_node['deps'].discard(node['key'])
+            if not waiting_node['deps']:
+                self._ready.append(waiting_node)
+
+    def _work(self):
+        sg = self.sg_factory()
+        batch_size = self.plan.batch_size
+        while True:
+            with self._cond:
+                while not self._ready and self._remaining:
+                    self._cond.wait()
+                if not self._remaining:
+                    self._cond.notify_all()
+                    return
+                nodes = list()
+                requests = list()
+                while self._ready and len(requests) < batch_size:
+                    node = self._ready.popleft()
+                    request = self._request(node)
+                    if request is None:
+                        self._finish(node, None)
+                        continue
+                    nodes.append(node)
+                    requests.append(request)
+                if not requests:
+                    self._cond.notify_all()
+                    continue
+
+            try:
+                results = sg.batch(requests)
+            except (sgtk.TankError, shotgun_api3.ShotgunError) as e:
+                logger.error('Batch of {} requests failed: {}'.format(len(requests), e))
+                results = [None] * len(requests)
+            except Exception:
+                # network errors must not kill the worker, its nodes would never finish
+                # and the other workers would wait forever
+                logger.exception('Batch of {} requests failed'.format(len(requests)))
+                results = [None] * len(requests)
+
+            with self._cond:
+                for node, result in zip(nodes, results):
+                    self._finish(node, result)
+                self._cond.notify_all()
+
+    def run(self):
+        """Execute the plan and wait for all workers.
+        :return: list of (entity_type, code, entity) created
+        """
+        # rows without requests are reported right away
+        for action in self.plan.actions:
+            if action['action'] in (SKIP, EXISTS, ERROR):
+                self.callback(action['code'], action['action'], action['row_number'])
+
+        self._build_graph()
+        if not self._remaining:
+            return self.created
+
+        threads = [threading.Thread(target=self._work) for _ in range(max(1, self.workers))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.created
+
+
+def execute_plan(sg, plan, callback, sg_factory=None, workers=MAX_WORKERS, cut_item_element_field=None):
+    """Send the planned requests in dependency order, cuts and sequences first, then shots,
+    elements and cut items.
+    :param sg: shotgun connection, used by all workers when no sg_factory is given
+    :param plan: ImportPlan
+    :param callback: function(code, status, row_number) called for every row
+    :param sg_factory: function returning a shotgun connection per worker thread
+    :param workers: int
+    :param cut_item_element_field: str custom CutItem field linking elements, None to not link them
+    :return: list of (entity_type, code, entity) created
+    """
+    if sg_factory is None:
+        # a single connection is not thread safe, send batches one at a time
+        sg_factory = lambda: sg
+        workers = 1
+    return ImportScheduler(plan, callback, sg_factory, workers, cut_item_element_field).run()
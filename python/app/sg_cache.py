@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+# Mind Machine customized
+
+import calendar
+import datetime
+import os
+import sqlite3
+import time
+
+import sgtk
+
+# standard toolkit logger
+logger = sgtk.platform.get_logger(__name__)
+
+# entity types kept in the cache
+CACHED_ENTITY_TYPES = ('Element', 'Sequence', 'Shot')
+
+# max number of codes in a single sqlite 'in' query, sqlite allows 999 variables
+QUERY_CHUNK_SIZE = 500
+
+# seconds of overlap when syncing, so entities updated during the last sync second are not missed
+SYNC_OVERLAP = 1
+
+# seconds between two full syncs, retirements are synced incrementally from the event log,
+# the full sync drops whatever the event log missed, e.g. entities deleted by an admin
+FULL_SYNC_INTERVAL = 24 * 60 * 60
+
+# bumped when the tables change, older cache files are rebuilt
+SCHEMA_VERSION = 3
+
+# rows are keyed by id, a renamed entity replaces its old code
+_schema = '''
+CREATE TABLE IF NOT EXISTS entity_code (
+    project_id INTEGER NOT NULL,
+    entity_type TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    code TEXT NOT NULL,
+    PRIMARY KEY (project_id, entity_type, id)
+);
+CREATE INDEX IF NOT EXISTS entity_code_code ON entity_code (project_id, entity_type, code);
+CREATE TABLE IF NOT EXISTS sync (
+    project_id INTEGER NOT NULL,
+    entity_type TEXT NOT NULL,
+    updated_at INTEGER NOT NULL,
+    synced_at INTEGER NOT NULL,
+    full_sync_at INTEGER NOT NULL,
+    PRIMARY KEY (project_id, entity_type)
+);
+'''
+
+
+class CodeCache(object):
+    """Local sqlite cache of project Shot, Sequence and Element codes to ids.
+
+    The cache is refreshed incrementally, only entities with an ``updated_at`` newer than
+    the last sync and retirement events logged since then are queried from Shotgun. Every
+    FULL_SYNC_INTERVAL all ids are queried again. Each thread must use its own instance.
+    """
+
+    def __init__(self, sg, project, db_path):
+        """
+        :param sg: shotgun connection
+        :param project: dict project entity
+        :param db_path: str path to the sqlite file
+        """
+        self.sg = sg
+        self.project = project
+        self.db_path = db_path
+        dir_path = os.path.dirname(db_path)
+        if dir_path and not os.path.isdir(dir_path):
+            os.makedirs(dir_path)
+        self._db = sqlite3.connect(db_path)
+        if self._db.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+            self._db.executescript('DROP TABLE IF EXISTS entity_code; DROP TABLE IF EXISTS sync;')
+            self._db.execute('PRAGMA user_version = {:d}'.format(SCHEMA_VERSION))
+        self._db.executescript(_schema)
+
+    @classmethod
+    def for_app(cls, app, sg):
+        """Open the cache in the app cache location, None if it cannot be opened.
+        :param app: sgtk Application
+        :param sg: shotgun connection
+        :return: CodeCache or None
+        """
+        db_path = os.path.join(app.cache_location, 'sg_codes.sqlite')
+        try:
+            return cls(sg, app.context.project, db_path)
+        except (sqlite3.Error, OSError, IOError) as e:
+            logger.warning('Cannot open code cache {}: {}'.format(db_path, e))
+            return None
+
+    def close(self):
+        self._db.close()
+
+    def sync(self, entity_types=CACHED_ENTITY_TYPES):
+        """Pull entities changed in shotgun since the last sync.
+        :param entity_types: iterable of str
+        :return: int number of entities updated in the cache
+        """
+        project_id = self.project['id']
+        now = int(time.time())
+        count = 0
+        for entity_type in entity_types:
+            row = self._db.execute('SELECT updated_at, synced_at, full_sync_at FROM sync '
+                                   'WHERE project_id = ? AND entity_type = ?', (project_id, entity_type)).fetchone()
+            full_sync = not row or now - row[2] >= FULL_SYNC_INTERVAL
+            filters = [['project', 'is', self.project]]
+            if not full_sync:
+                since = datetime.datetime.fromtimestamp(row[0] - SYNC_OVERLAP)
+                filters.append(['updated_at', 'greater_than', since])
+
+            entities = self.sg.find(entity_type, filters, ['code', 'updated_at'])
+
+            last_updated_at = row[0] if row else 0
+            full_sync_at = now if full_sync else row[2]
+            values = list()
+            removed_ids = list()
+            if not full_sync:
+                removed_ids.extend((project_id, entity_type, entity_id)
+                                   for entity_id in self._retired_ids(entity_type, row[1] - SYNC_OVERLAP))
+            for entity in entities:
+                if entity.get('updated_at'):
+                    updated_at = calendar.timegm(entity['updated_at'].utctimetuple())
+                    last_updated_at = max(last_updated_at, updated_at)
+                if entity.get('code'):
+                    values.append((project_id, entity_type, entity['id'], entity['code']))
+                else:
+                    # code was cleared
+                    removed_ids.append((project_id, entity_type, entity['id']))
+
+            with self._db:
+                if full_sync:
+                    # entities missing from a full sync were retired or deleted
+                    self._db.execute('DELETE FROM entity_code WHERE project_id = ? AND entity_type = ?',
+                                     (project_id, entity_type))
+                else:
+                    self._db.executemany('DELETE FROM entity_code WHERE project_id = ? AND entity_type = ? AND id = ?',
+                                         removed_ids)
+                self._db.executemany('INSERT OR REPLACE INTO entity_code VALUES (?, ?, ?, ?)', values)
+                self._db.execute('INSERT OR REPLACE INTO sync VALUES (?, ?, ?, ?, ?)',
+                                 (project_id, entity_type, last_updated_at, now, full_sync_at))
+            count += len(values)
+            logger.info('Synced {} {} codes to local cache{}, {} retired'.format(
+                len(values), entity_type, ' (full sync)' if full_sync else '', len(removed_ids)))
+        return count
+
+    def _retired_ids(self, entity_type, since):
+        """Ids of entities retired since a time, from the shotgun event log.
+        :param entity_type: str
+        :param since: int epoch seconds
+        :return: list of int
+        """
+        filters = [['project', 'is', self.project],
+                   ['event_type', 'is', 'Shotgun_{}_Retirement'.format(entity_type)],
+                   ['created_at', 'greater_than', datetime.datetime.fromtimestamp(since)]]
+        entity_ids = list()
+        for event in self.sg.find('EventLogEntry', filters, ['entity', 'meta']):
+            # the entity link of a retired entity may be empty, meta always has its id
+            entity_id = (event.get('meta') or dict()).get('entity_id') or (event.get('entity') or dict()).get('id')
+            if entity_id:
+                entity_ids.append(entity_id)
+        return entity_ids
+
+    def remove(self, entity_type, entity_id):
+        """Remove an entity that no longer exists in shotgun.
+        :param entity_type: str
+        :param entity_id: int
+        :return: None
+        """
+        with self._db:
+            self._db.execute('DELETE FROM entity_code WHERE project_id = ? AND entity_type = ? AND id = ?',
+                             (self.project['id'], entity_type, entity_id))
+
+    def find_by_code(self, entity_type, codes):
+        """Look up entities by code in the local cache.
+        :param entity_type: str
+        :param codes: iterable of str
+        :return: dict of code to entity dict with type, id and code
+        """
+        codes = sorted(set(code for code in codes if code))
+        found = dict()
+        for i in range(0, len(codes), QUERY_CHUNK_SIZE):
+            chunk = codes[i:i + QUERY_CHUNK_SIZE]
+            # a code reused after a rename maps to the newest entity
+            query = 'SELECT code, id FROM entity_code WHERE project_id = ? AND entity_type = ? AND code IN ({})' \
+                    ' ORDER BY id'
+            query = query.format(', '.join('?' * len(chunk)))
+            for code, entity_id in self._db.execute(query, [self.project['id'], entity_type] + chunk):
+                found[code] = {'type': entity_type, 'id': entity_id, 'code': code}
+        return found
+
+    def add(self, entity):
+        """Add an entity created by this app, so it is known before the next sync.
+        :param entity: dict with type, id and code
+        :return: None
+        """
+        with self._db:
+            self._db.execute('INSERT OR REPLACE INTO entity_code VALUES (?, ?, ?, ?)',
+                             (self.project['id'], entity['type'], entity['id'], entity['code']))
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# Mind Machine customized
+
+import sgtk
+
+# standard toolkit logger
+logger = sgtk.platform.get_logger(__name__)
+
+# max number of codes sent in a single 'in' filter
+LOOKUP_CHUNK_SIZE = 500
+
+
+def find_by_code(sg, project, entity_type, codes, fields=None, cache=None):
+    """Find all entities of a type matching a list of codes with as few queries as possible.
+    :param sg: shotgun connection
+    :param project: dict project entity
+    :param entity_type: str
+    :param codes: iterable of str
+    :param fields: list of str, 'code' is always returned
+    :param cache: synced CodeCache, when given only the local cache is queried
+                  and entities only have type, id and code
+    :return: dict of code to entity dict
+    """
+    if cache is not None:
+        found = cache.find_by_code(entity_type, codes)
+        logger.info('Found {} {} codes in local cache'.format(len(found), entity_type))
+        return found
+
+    fields = list(fields or list())
+    if 'code' not in fields:
+        fields.append('code')
+
+    codes = sorted(set(code for code in codes if code))
+    found = dict()
+    for i in range(0, len(codes), LOOKUP_CHUNK_SIZE):
+        chunk = codes[i:i + LOOKUP_CHUNK_SIZE]
+        filters = [['project', 'is', project], ['code', 'in', chunk]]
+        for entity in sg.find(entity_type, filters, fields):
+            found[entity['code']] = entity
+
+    logger.info('Found {} of {} {} codes in shotgun'.format(len(found), len(codes), entity_type))
+    return found
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# Mind Machine customized
+
+from bisect import bisect_left
+import re
+
+# columns that can be filtered by prefix
+FILTER_COLUMNS = ('Shot Code', 'Entity Type', 'Parent Shots', 'Status')
+
+# columns sorted as numbers instead of text
+NUMERIC_COLUMNS = ('Cut Duration',)
+
+# highest unicode character, used as the upper bound of a prefix range
+_max_char = u'\uffff'
+
+# split text into digit and non digit runs for natural sorting, sh010 before sh0100
+_rgx_digits = re.compile(r'(\d+)')
+
+
+def sort_key(column, value):
+    """Sort key of a table value, extracted once per row.
+    :param column: str
+    :param value: str
+    :return: tuple
+    """
+    value = value or ''
+    if column in NUMERIC_COLUMNS:
+        try:
+            return (0, int(value))
+        except ValueError:
+            return (1, value)
+    return tuple((0, int(part)) if part.isdigit() else (1, part.lower())
+                 for part in _rgx_digits.split(value) if part)
+
+
+class TableIndex(object):
+    """Precomputed filter and sort keys for the rows of the edl table.
+
+    Rows are the logical row numbers of the table widget. For every filter column a sorted
+    list of (lower case value, row) pairs gives the rows matching a prefix with two bisects.
+    Sort keys are extracted once from the row data, never from widget text.
+    """
+
+    def __init__(self, columns):
+        """
+        :param columns: list of str table header names
+        """
+        self.columns = list(columns)
+        if 'Status' not in self.columns:
+            self.columns.append('Status')
+        self.rows = list()
+        self._values = dict((column, dict()) for column in FILTER_COLUMNS)
+        self._sort_keys = dict((column, dict()) for column in self.columns)
+        self._prefix_index = dict()
+        self._dirty = set(FILTER_COLUMNS)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add_row(self, row, row_dict):
+        """Index a table row.
+        :param row: int logical table row
+        :param row_dict: dict of header name to value
+        :return: None
+        """
+        self.rows.append(row)
+        for column in self.columns:
+            value = row_dict.get(column) or ''
+            self._sort_keys[column][row] = sort_key(column, value)
+            if column in self._values:
+                self._values[column][row] = value.lower()
+        self._dirty.update(FILTER_COLUMNS)
+
+    def set_value(self, row, column, value):
+        """Update a single value, e.g. the status after import.
+        :param row: int
+        :param column: str
+        :param value: str
+        :return: None
+        """
+        value = value or ''
+        self._sort_keys[column][row] = sort_key(column, value)
+        if column in self._values:
+            self._values[column][row] = value.lower()
+            # rebuilt lazily on the next filter, status updates arrive one row at a time
+            self._dirty.add(column)
+
+    def _build(self, column):
+        self._prefix_index[column] = sorted((value, row) for row, value in self._values[column].items())
+        self._dirty.discard(column)
+
+    def match(self, column, prefix):
+        """Rows where the column value starts with prefix, case insensitive.
+        :param column: str one of FILTER_COLUMNS
+        :param prefix: str
+        :return: set of int
+        """
+        if column in self._dirty:
+            self._build(column)
+        prefix = prefix.lower()
+        pairs = self._prefix_index[column]
+        start = bisect_left(pairs, (prefix,))
+        end = bisect_left(pairs, (prefix + _max_char,), start)
+        return set(row for value, row in pairs[start:end])
+
+    def filter(self, text, column=None):
+        """Rows matching a filter text, in any filter column unless one is given.
+        :param text: str
+        :param column: str or None
+        :return: set of int
+        """
+        text = text.strip()
+        if not text:
+            return set(self.rows)
+        if column:
+            return self.match(column, text)
+        rows = set()
+        for column in FILTER_COLUMNS:
+            rows.update(self.match(column, text))
+        return rows
+
+    def sorted_rows(self, column, descending=False):
+        """All rows ordered by a column.
+        :param column: str
+        :param descending: bool
+        :return: list of int
+        """
+        keys = self._sort_keys[column]
+        return sorted(self.rows, key=keys.__getitem__, reverse=descending)
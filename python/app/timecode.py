@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+# Mind Machine customized
+
+from array import array
+import re
+
+import sgtk
+
+# frame rate used when an edl gives no hint, the historic default of this app
+DEFAULT_FPS = '23.976'
+
+# nominal (integer) frames per second of every supported rate
+NOMINAL_FPS = {
+    '23.976': 24,
+    '24': 24,
+    '25': 25,
+    '29.97': 30,
+    '30': 30,
+    '50': 50,
+    '59.94': 60,
+    '60': 60,
+}
+
+# rates that can be drop frame, with the frame numbers dropped at each minute but every tenth
+DROP_FRAMES = {
+    '29.97': 2,
+    '59.94': 4,
+}
+
+# max difference between a configured rate and a supported one, e.g. 23.98 is 23.976
+_fps_tolerance = 0.01
+
+# regex to match fcm lines, e.g. FCM: DROP FRAME
+rgx_fcm = re.compile(r'^\s*FCM:\s*(NON[-\s]?DROP|DROP)', re.IGNORECASE)
+
+# regex to match timecodes, a semicolon or period before the frames marks drop frame
+rgx_timecode = re.compile(r'\b(\d{2}):(\d{2}):(\d{2})([:;.,])(\d{2})\b')
+
+
+def normalize_fps(fps):
+    """Map a configured frame rate, e.g. 24.0, 23.98 or 30, to a supported one.
+    :param fps: str or number
+    :return: str one of NOMINAL_FPS
+    """
+    if str(fps) in NOMINAL_FPS:
+        return str(fps)
+    try:
+        value = float(fps)
+    except (TypeError, ValueError):
+        value = None
+    if value is not None:
+        for supported_fps in NOMINAL_FPS:
+            if abs(float(supported_fps) - value) < _fps_tolerance:
+                return supported_fps
+    raise sgtk.TankError('Unsupported frame rate {!r}, use one of {}'.format(
+        fps, ', '.join(sorted(NOMINAL_FPS, key=float))))
+
+
+def detect_rate(lines, default_fps=DEFAULT_FPS):
+    """Detect the frame rate and drop frame mode of an edl from its FCM lines and timecodes.
+    EDLs do not store the rate, it is derived from the drop frame mode and the highest frame number.
+    :param lines: iterable of str edl lines
+    :param default_fps: str rate used for 24 fps timecodes, 23.976 and 24 cannot be told apart
+    :return: tuple of fps str and drop frame bool
+    """
+    drop = False
+    max_frame = 0
+    for line in lines:
+        m = rgx_fcm.match(line)
+        if m:
+            if m.group(1).upper() == 'DROP':
+                drop = True
+            continue
+        for tc in rgx_timecode.finditer(line):
+            if tc.group(4) in ';.,':
+                drop = True
+            max_frame = max(max_frame, int(tc.group(5)))
+
+    if max_frame >= 50:
+        fps = '59.94' if drop else '60'
+    elif max_frame >= 30:
+        # only 59.94 has drop frame above 30 fps
+        fps = '59.94' if drop else '50'
+    elif drop or max_frame >= 25:
+        fps = '29.97'
+    elif max_frame >= 24:
+        fps = '25'
+    else:
+        fps = default_fps
+    return fps, drop and fps in DROP_FRAMES
+
+
+class TimecodeTable(object):
+    """Timecode to frame conversion for one frame rate with precomputed tables.
+
+    Frames at the start of every minute of the day are computed once, drop frame included,
+    so a conversion is a table lookup plus seconds and frames. Converted timecodes are
+    memoized, edls repeat the same timecodes many times.
+    """
+
+    def __init__(self, fps, drop=False):
+        """
+        :param fps: str one of NOMINAL_FPS
+        :param drop: bool
+        """
+        self.fps = fps
+        self.nominal_fps = NOMINAL_FPS[fps]
+        self.drop = bool(drop and fps in DROP_FRAMES)
+        self.dropped = DROP_FRAMES[fps] if self.drop else 0
+        self.frames_per_minute = self.nominal_fps * 60
+
+        # frames at the start of every minute of a day
+        self.minute_start = array('l', [0] * (24 * 60))
+        frames = 0
+        for minute in range(24 * 60):
+            self.minute_start[minute] = frames
+            frames += self.frames_per_minute
+            if self.drop and minute % 10:
+                frames -= self.dropped
+        self.frames_per_day = frames
+
+        self._frames = dict()
+        self._timecodes = dict()
+
+    def to_frames(self, timecode):
+        """
+        :param timecode: str HH:MM:SS:FF, drop frame timecodes may use ; before the frames
+        :return: int frames since 00:00:00:00
+        """
+        frames = self._frames.get(timecode)
+        if frames is None:
+            hh, mm, ss, ff = int(timecode[0:2]), int(timecode[3:5]), int(timecode[6:8]), int(timecode[9:11])
+            frames = self.minute_start[hh * 60 + mm] + ss * self.nominal_fps + ff
+            # the first frame numbers of a dropped minute do not exist
+            if self.drop and mm % 10:
+                frames -= self.dropped
+            self._frames[timecode] = frames
+        return frames
+
+    def to_timecode(self, frames):
+        """
+        :param frames: int frames since 00:00:00:00
+        :return: str
+        """
+        timecode = self._timecodes.get(frames)
+        if timecode is None:
+            day_frames = frames % self.frames_per_day
+            # estimate the minute, then step back if the estimate is past the frame
+            minute = min(day_frames // (self.frames_per_minute - self.dropped), 24 * 60 - 1)
+            while self.minute_start[minute] > day_frames:
+                minute -= 1
+            rest = day_frames - self.minute_start[minute]
+            if self.drop and minute % 10:
+                rest += self.dropped
+            ss, ff = divmod(rest, self.nominal_fps)
+            separator = ';' if self.drop else ':'
+            timecode = '{:02d}:{:02d}:{:02d}{}{:02d}'.format(minute // 60, minute % 60, ss, separator, ff)
+            self._timecodes[frames] = timecode
+        return timecode
+
+    def duration(self, start_timecode, end_timecode):
+        """Frames between two timecodes.
+        :param start_timecode: str
+        :param end_timecode: str
+        :return: int
+        """
+        return self.to_frames(end_timecode) - self.to_frames(start_timecode)
+
+
+# one table per rate and drop frame mode, shared by all edls
+_tables = dict()
+
+
+def get_table(fps, drop=False):
+    """
+    :param fps: str
+    :param drop: bool
+    :return: TimecodeTable
+    """
+    key = (fps, bool(drop and fps in DROP_FRAMES))
+    table = _tables.get(key)
+    if table is None:
+        table = _tables[key] = TimecodeTable(fps, drop)
+    return table
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+# Mind Machine customized
+
+from collections import Counter
+import hashlib
+import json
+import os
+import threading
+import time
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+import sgtk
+
+from .edl_events import RGX_CLIP_NAME, EventTable
+from .field_mapping import PayloadBuilder
+from .planner import build_plan
+from .scheduler import execute_plan
+from .sg_cache import CodeCache
+from .sg_lookup import find_by_code
+from .timecode import normalize_fps
+
+# standard toolkit logger
+logger = sgtk.platform.get_logger(__name__)
+
+# seconds between two scans of the watch folder
+DEFAULT_POLL_INTERVAL = 5
+
+# seconds a file must stay unchanged before it is ingested, editorial may still be writing it
+DEFAULT_DEBOUNCE = 10
+
+# number of edl files processed in parallel
+DEFAULT_WORKERS = 2
+
+# max number of edl files waiting for a worker, scanning blocks when the queue is full
+DEFAULT_QUEUE_SIZE = 16
+
+# read files in chunks when hashing
+_hash_chunk_size = 1024 * 1024
+
+
+def file_hash(file_path):
+    """
+    :param file_path: str
+    :return: str sha1 hex digest of the file content
+    """
+    sha1 = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_hash_chunk_size), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def normalize_line_terminators(edl_file_path, process_dir):
+    """Copy an edl file to the process directory with unix line terminators.
+    :param edl_file_path: str
+    :param process_dir: str
+    :return: str path of the copy
+    """
+    if not os.path.isdir(process_dir):
+        os.makedirs(process_dir)
+    base_name = os.path.basename(edl_file_path).strip().replace(' ', '_')
+    edl_file_copy = os.path.join(process_dir, base_name)
+    with open(edl_file_path, 'rb') as f:
+        content = f.read()
+    content = content.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+    with open(edl_file_copy, 'wb') as f:
+        f.write(content)
+    return edl_file_copy
+
+
+class IngestState(object):
+    """Content hashes of edl files already ingested, kept in a json file."""
+
+    def __init__(self, file_path):
+        """
+        :param file_path: str
+        """
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self._hashes = dict()
+        if os.path.exists(file_path):
+            with open(file_path) as f:
+                self._hashes = json.load(f)
+
+    def __contains__(self, content_hash):
+        with self._lock:
+            return content_hash in self._hashes
+
+    def add(self, content_hash, edl_file_path):
+        """
+        :param content_hash: str
+        :param edl_file_path: str
+        :return: None
+        """
+        with self._lock:
+            self._hashes[content_hash] = {'path': edl_file_path, 'ingested_at': time.time()}
+            dir_path = os.path.dirname(self.file_path)
+            if dir_path and not os.path.isdir(dir_path):
+                os.makedirs(dir_path)
+            with open(self.file_path, 'w') as f:
+                json.dump(self._hashes, f, indent=1, sort_keys=True)
+
+
+class EdlWatcher(object):
+    """Headless watcher importing new or changed edl files from a turnover folder.
+
+    The folder is polled, files are ingested once they stopped changing for the debounce time
+    and only if their content hash was not ingested before. Files wait in a bounded queue for
+    a limited number of workers. Each import is planned against shotgun first, so only new
+    or changed shots and elements are written.
+    """
+
+    def __init__(self, app, watch_path, poll_interval=DEFAULT_POLL_INTERVAL, debounce=DEFAULT_DEBOUNCE,
+                 workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE):
+        """
+        :param app: sgtk Application
+        :param watch_path: str
+        :param poll_interval: number seconds
+        :param debounce: number seconds
+        :param workers: int
+        :param queue_size: int
+        """
+        self.app = app
+        self.project = app.context.project
+        self.watch_path = watch_path
+        self.process_path = os.path.join(watch_path, 'edl_process')
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.workers = max(1, workers)
+        self.state = IngestState(os.path.join(app.cache_location, 'watch_folder_ingested.json'))
+        self._queue = queue.Queue(maxsize=queue_size)
+        # path to (mtime, size, time the file was first seen with them)
+        self._seen = dict()
+        # path to (mtime, size) last queued
+        self._queued = dict()
+        # parsing runs in parallel, planning and executing one edl at a time so two reels
+        # never plan the same new sequence or parent shot
+        self._import_lock = threading.Lock()
+        self._running = False
+        # compiled once for all ingested files
+        self.payload_builder = PayloadBuilder.from_app(app)
+        # project frame rate, None detects the rate of every edl file
+        self.fps = normalize_fps(app.get_setting('fps')) if app.get_setting('fps') else None
+
+    def scan(self):
+        """Queue edl files that are stable and not ingested yet.
+        :return: int number of files queued
+        """
+        now = time.time()
+        count = 0
+        for file_name in sorted(os.listdir(self.watch_path)):
+            if not file_name.lower().endswith('.edl'):
+                continue
+            edl_file_path = os.path.join(self.watch_path, file_name)
+            try:
+                stat = os.stat(edl_file_path)
+            except OSError:
+                continue
+            signature = (stat.st_mtime, stat.st_size)
+
+            seen = self._seen.get(edl_file_path)
+            if not seen or seen[:2] != signature:
+                self._seen[edl_file_path] = signature + (now,)
+                continue
+            if now - seen[2] < self.debounce or self._queued.get(edl_file_path) == signature:
+                continue
+
+            self._queued[edl_file_path] = signature
+            content_hash = file_hash(edl_file_path)
+            if content_hash in self.state:
+                continue
+            logger.info('Queueing {}'.format(edl_file_path))
+            # blocks while the queue is full
+            self._queue.put((edl_file_path, content_hash))
+            count += 1
+        return count
+
+    def ingest(self, edl_file_path, content_hash):
+        """Import one edl file.
+        :param edl_file_path: str
+        :param content_hash: str
+        :return: Counter of row statuses
+        """
+        edl_file_copy = normalize_line_terminators(edl_file_path, self.process_path)
+        event_table = EventTable(self.fps, RGX_CLIP_NAME)
+        event_table.load([edl_file_copy])
+        statuses = Counter()
+        if not len(event_table):
+            logger.warning('No edl data in {}'.format(edl_file_path))
+            self.state.add(content_hash, edl_file_path)
+            return statuses
+
+        def count_status(code, status, row_number):
+            statuses[status] += 1
+
+        with self._import_lock:
+            sg = self.app.shotgun
+            code_cache = CodeCache.for_app(self.app, sg)
+            if code_cache:
+                code_cache.sync()
+            existing_shots = find_by_code(sg, self.project, 'Shot', event_table.parent_shot_codes(),
+                                          cache=code_cache)
+            rows = event_table.import_rows(existing_shots)
+            plan = build_plan(sg, self.project, rows, code_cache, cut_events=event_table.events,
+                              fps=event_table.fps, payload_builder=self.payload_builder)
+            created = execute_plan(sg, plan, count_status, sg_factory=lambda: self.app.shotgun,
+                                   cut_item_element_field=self.app.get_setting('cut_item_element_field'))
+            if code_cache:
+                for entity_type, code, entity in created:
+                    code_cache.add({'type': entity_type, 'id': entity['id'], 'code': code})
+                code_cache.close()
+
+        logger.info('Ingested {}: {}'.format(edl_file_path, dict(statuses)))
+        # files with errors are tried again when they change or the watcher restarts
+        if not statuses['error']:
+            self.state.add(content_hash, edl_file_path)
+        return statuses
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                try:
+                    self.ingest(*item)
+                except Exception:
+                    # keep the worker alive, the file is tried again when it changes
+                    logger.exception('Failed to ingest {}'.format(item[0]))
+            finally:
+                self._queue.task_done()
+
+    def run(self):
+        """Poll the watch folder until stopped.
+        :return: None
+        """
+        logger.info('Watching {} for edl files'.format(self.watch_path))
+        self._running = True
+        threads = [threading.Thread(target=self._work) for _ in range(self.workers)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            while self._running:
+                self.scan()
+                time.sleep(self.poll_interval)
+        except KeyboardInterrupt:
+            logger.info('Stopping watch folder')
+        finally:
+            self._running = False
+            for _ in threads:
+                self._queue.put(None)
+            for thread in threads:
+                thread.join()
+
+    def stop(self):
+        self._running = False
+
+
+def run_watch_folder(app_instance, watch_path=None):
+    """Run the watch folder with the app settings, blocks until interrupted.
+    :param app_instance: sgtk Application
+    :param watch_path: str, defaults to the watch_folder setting
+    :return: None
+    """
+    watch_path = watch_path or app_instance.get_setting('watch_folder')
+    if not watch_path or not os.path.isdir(watch_path):
+        logger.error('Watch folder does not exist: {}'.format(watch_path))
+        return
+    try:
+        watcher = EdlWatcher(app_instance, watch_path,
+                             poll_interval=app_instance.get_setting('watch_poll_interval'),
+                             debounce=app_instance.get_setting('watch_debounce'),
+                             workers=app_instance.get_setting('watch_workers'))
+    except sgtk.TankError as e:
+        # invalid fps or field_mapping setting
+        logger.error('Cannot start watch folder: {}'.format(e))
+        return
+    watcher.run()